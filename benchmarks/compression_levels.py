@@ -0,0 +1,60 @@
+"""
+Compare compression ratio and throughput of each compression level, with and
+without lazy matching, on the RFC 1951 text fixture.
+
+usage: python benchmarks/compression_levels.py [file] [--repeat N]
+"""
+from argparse import ArgumentParser
+from dataclasses import replace
+from pathlib import Path
+from time import perf_counter
+
+from rfc_1951.compress import (
+    COMPRESSION_LEVELS,
+    get_greedy_tokens,
+    get_lazy_tokens,
+    split_tokens,
+)
+
+FIXTURE = (
+    Path(__file__).parents[1] / "tests" / "rfc_1951" / "data" / "rfc_1951"
+)
+
+
+def deflated_size(content_in: bytes, tokens: list[tuple[int, int]]) -> int:
+    """Return the size in bytes of the smallest encoding of tokens."""
+    bits = 0
+    for block in split_tokens(tokens, content_in):
+        bits += 3 + min(
+            block.stored_size(), block.fixed_size(), block.dynamic_size()
+        )
+    return (bits + 7) // 8
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", nargs="?", type=Path, default=FIXTURE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    content_in = args.file.read_bytes()
+    print(f"{args.file.name}: {len(content_in)} bytes")
+    print(f"{'level':>5} {'matching':>8} {'ratio':>7} {'MB/s':>7}")
+    for level, config in COMPRESSION_LEVELS.items():
+        for lazy in (False, True):
+            get_tokens = get_lazy_tokens if lazy else get_greedy_tokens
+            config = replace(config, lazy=lazy)
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = perf_counter()
+                tokens = get_tokens(content_in, config)
+                best = min(best, perf_counter() - start)
+            ratio = len(content_in) / deflated_size(content_in, tokens)
+            throughput = len(content_in) / best / 2 ** 20
+            print(
+                f"{level:>5} {'lazy' if lazy else 'greedy':>8}"
+                f" {ratio:>7.3f} {throughput:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure the cost of checking DecompressionLimits while decompressing, by
+timing gunzip of a gzip file with and without (generous) limits. Runs of
+the two alternate, in swapped order every other repeat, and the overhead
+of each pair of runs is taken, so changes in machine load affect both
+alike. Single pairs still vary by several percent on a busy machine, so
+the median overhead is printed with a bootstrap 95% confidence interval,
+and the overhead is only reported within BOUND if the whole interval is.
+
+usage: python benchmarks/decompression_limits.py [file] [--repeat N]
+"""
+import zlib
+from argparse import ArgumentParser
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from statistics import median
+from time import process_time
+
+from rfc_1951.decompress import DecompressionLimits, gunzip
+
+FIXTURE = (
+    Path(__file__).parents[1] / "tests" / "rfc_1951" / "data" / "rfc_1951"
+)
+# limits the input is well within, so every check is made and passes
+LIMITS = DecompressionLimits(2 ** 40, 2000, 2 ** 20)
+# the overhead the checks are meant to stay under
+BOUND = 0.02
+# resamples of the pairs for the confidence interval of the median
+BOOTSTRAP_SAMPLES = 2000
+
+
+def median_interval(values: list[float]) -> tuple[float, float]:
+    """Return a bootstrap 95% confidence interval of the median of values."""
+    rng = Random(0)
+    medians = sorted(
+        median(rng.choices(values, k=len(values)))
+        for _ in range(BOOTSTRAP_SAMPLES)
+    )
+    return (
+        medians[int(0.025 * BOOTSTRAP_SAMPLES)],
+        medians[int(0.975 * BOOTSTRAP_SAMPLES) - 1],
+    )
+
+
+def gunzip_time(zipped: bytes, limits: DecompressionLimits | None) -> float:
+    start = process_time()
+    gunzip(BytesIO(zipped), limits)
+    return process_time() - start
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", nargs="?", type=Path, default=FIXTURE)
+    parser.add_argument("--repeat", type=int, default=101)
+    args = parser.parse_args()
+    content_in = args.file.read_bytes()
+    print(
+        f"{'input':>12} {'no limits s':>11} {'limits s':>9} {'overhead':>8}"
+        f" {'95% interval':>17} {f'< {BOUND:.0%}':>5}"
+    )
+    for name, content in [
+        (args.file.name, content_in * 8),
+        ("zeros", bytes(2 ** 24)),
+    ]:
+        compressor = zlib.compressobj(wbits=31)
+        zipped = compressor.compress(content) + compressor.flush()
+        unlimited = []
+        limited = []
+        for i in range(args.repeat):
+            if i % 2:
+                limited.append(gunzip_time(zipped, LIMITS))
+                unlimited.append(gunzip_time(zipped, None))
+            else:
+                unlimited.append(gunzip_time(zipped, None))
+                limited.append(gunzip_time(zipped, LIMITS))
+        overheads = [b / a - 1 for a, b in zip(unlimited, limited)]
+        lower, upper = median_interval(overheads)
+        print(
+            f"{name:>12} {median(unlimited):>11.3f} {median(limited):>9.3f}"
+            f" {median(overheads):>+8.2%} {lower:>+8.2%} {upper:>+8.2%}"
+            f" {'yes' if upper < BOUND else 'no':>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
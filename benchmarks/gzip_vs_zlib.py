@@ -0,0 +1,275 @@
+"""
+Compare gzip and gunzip throughput, ratio and peak memory of rfc_1951
+against the stdlib zlib, for each block type and level over several corpora.
+
+Each case runs in a fresh process so its peak RSS isn't inflated by earlier
+cases. Results are printed as a table and saved as JSON, so runs from
+different commits can be compared to catch regressions in the hot paths.
+
+usage: python benchmarks/gzip_vs_zlib.py [--sizes 1K 64K 1M] [--levels 1 6 9]
+    [--block-types auto dynamic] [--corpora text random] [--repeat N]
+    [--output results.json] [--baseline earlier.json]
+"""
+import json
+import platform
+import resource
+import sys
+import zlib
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+from rfc_1951.compress import COMPRESSION_LEVELS, gzip
+from rfc_1951.core import BlockType
+from rfc_1951.decompress import gunzip
+
+FIXTURE = (
+    Path(__file__).parents[1] / "tests" / "rfc_1951" / "data" / "rfc_1951"
+)
+SIZE_SUFFIXES = {"K": 2 ** 10, "M": 2 ** 20}
+BLOCK_TYPES = {
+    "auto": None,
+    "stored": BlockType.NO_COMPRESSION,
+    "fixed": BlockType.FIXED_HUFFMAN_COMPRESSION,
+    "dynamic": BlockType.DYNAMIC_HUFFMAN_COMPRESSION,
+}
+# ru_maxrss is in KiB on Linux and bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 2 ** 10
+# zlib's wbits for a gzip header and trailer
+ZLIB_GZIP_WBITS = 31
+
+
+def parse_size(size: str) -> int:
+    """Parse a size like 512, 1K or 64M."""
+    size = size.upper().removesuffix("B").removesuffix("I")
+    if size[-1:] in SIZE_SUFFIXES:
+        return int(size[:-1]) * SIZE_SUFFIXES[size[-1]]
+    return int(size)
+
+
+def format_size(size: int) -> str:
+    for suffix, unit in reversed(SIZE_SUFFIXES.items()):
+        if size >= unit and size % unit == 0:
+            return f"{size // unit}{suffix}"
+    return str(size)
+
+
+def repeat_to_size(content: bytes, size: int) -> bytes:
+    return (content * (size // len(content) + 1))[:size]
+
+
+def text_corpus(size: int) -> bytes:
+    """
+    English-like text in the spirit of the Canterbury corpus: words of the
+    RFC drawn at random with their frequencies, broken into lines, so
+    matches are short and scattered rather than whole repeated paragraphs.
+    """
+    words = FIXTURE.read_bytes().split()
+    rng = Random(size)
+    lines = []
+    length = 0
+    while length < size:
+        line = b" ".join(rng.choices(words, k=rng.randint(6, 14)))
+        lines.append(line)
+        length += len(line) + 1
+    return b"\n".join(lines)[:size]
+
+
+CORPORA = {
+    "text": text_corpus,
+    "random": lambda size: Random(size).randbytes(size),
+    "zeros": bytes,
+    "rfc_1951": lambda size: repeat_to_size(FIXTURE.read_bytes(), size),
+}
+
+
+def zlib_gzip(content_in: bytes, level: int) -> bytes:
+    # zlib.compress only takes wbits from Python 3.11
+    compressor = zlib.compressobj(level, wbits=ZLIB_GZIP_WBITS)
+    return compressor.compress(content_in) + compressor.flush()
+
+
+def best_time(function, repeat: int) -> tuple[float, bytes]:
+    """Return the fastest of repeat calls of function and its result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+
+def run_case(
+    corpus: str,
+    size: int,
+    implementation: str,
+    block_type: str,
+    level: int,
+    repeat: int,
+) -> dict:
+    """Benchmark one case (run in a fresh worker process)."""
+    content_in = CORPORA[corpus](size)
+    if implementation == "zlib":
+        compress_time, compressed = best_time(
+            lambda: zlib_gzip(content_in, level), repeat
+        )
+        decompress_time, content_out = best_time(
+            lambda: zlib.decompress(compressed, wbits=ZLIB_GZIP_WBITS),
+            repeat,
+        )
+    else:
+        compress_time, compressed = best_time(
+            lambda: gzip(BytesIO(content_in), BLOCK_TYPES[block_type], level),
+            repeat,
+        )
+        decompress_time, content_out = best_time(
+            lambda: gunzip(BytesIO(compressed)), repeat
+        )
+    if content_out != content_in:
+        raise AssertionError(
+            f"{implementation} did not round trip {corpus} at {size} bytes"
+        )
+    megabytes = size / 2 ** 20
+    return {
+        "corpus": corpus,
+        "size": size,
+        "implementation": implementation,
+        "block_type": block_type,
+        "level": level,
+        "compressed_size": len(compressed),
+        "ratio": size / len(compressed),
+        "compress_mb_s": megabytes / compress_time,
+        "decompress_mb_s": megabytes / decompress_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        * RSS_UNIT
+        / 2 ** 20,
+    }
+
+
+def get_cases(args) -> list[tuple]:
+    cases = []
+    for corpus in args.corpora:
+        for size in args.sizes:
+            for level in args.levels:
+                cases.append((corpus, size, "zlib", "-", level, args.repeat))
+                for block_type in args.block_types:
+                    cases.append(
+                        (
+                            corpus,
+                            size,
+                            "rfc_1951",
+                            block_type,
+                            level,
+                            args.repeat,
+                        )
+                    )
+    return cases
+
+
+def case_key(result: dict) -> tuple:
+    return tuple(
+        result[key]
+        for key in ("corpus", "size", "implementation", "block_type", "level")
+    )
+
+
+def compare(results: list[dict], baseline: Path):
+    """Print the throughput change of each case also in a baseline run."""
+    earlier = {
+        case_key(result): result
+        for result in json.loads(baseline.read_text())["results"]
+    }
+    print(f"change from {baseline}:")
+    for result in results:
+        before = earlier.get(case_key(result))
+        if before is None:
+            continue
+        changes = " ".join(
+            f"{key} {result[key] / before[key] - 1:>+7.1%}"
+            for key in ("compress_mb_s", "decompress_mb_s")
+        )
+        print(
+            f"{result['corpus']:>8} {format_size(result['size']):>5}"
+            f" {result['implementation']:>8} {result['block_type']:>7}"
+            f" {result['level']:>5} {changes}"
+        )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=[2 ** 10, 2 ** 16, 2 ** 20],
+        help="input sizes such as 1K or 64M",
+    )
+    parser.add_argument(
+        "--levels",
+        nargs="+",
+        type=int,
+        choices=list(COMPRESSION_LEVELS),
+        default=[1, 6, 9],
+    )
+    parser.add_argument(
+        "--block-types",
+        nargs="+",
+        choices=list(BLOCK_TYPES),
+        default=list(BLOCK_TYPES),
+    )
+    parser.add_argument(
+        "--corpora", nargs="+", choices=list(CORPORA), default=list(CORPORA)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output", type=Path, default=Path("gzip_vs_zlib.json")
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="the JSON output of an earlier run to compare throughput with",
+    )
+    args = parser.parse_args()
+    print(
+        f"{'corpus':>8} {'size':>5} {'impl':>8} {'block':>7} {'level':>5}"
+        f" {'ratio':>7} {'gzip MB/s':>9} {'gunzip MB/s':>11} {'RSS MB':>7}"
+    )
+    results = []
+    for case in get_cases(args):
+        # max_tasks_per_child isn't available before 3.11, so start a new
+        # pool for every case
+        with ProcessPoolExecutor(1) as executor:
+            result = executor.submit(run_case, *case).result()
+        results.append(result)
+        print(
+            f"{result['corpus']:>8} {format_size(result['size']):>5}"
+            f" {result['implementation']:>8} {result['block_type']:>7}"
+            f" {result['level']:>5} {result['ratio']:>7.3f}"
+            f" {result['compress_mb_s']:>9.2f}"
+            f" {result['decompress_mb_s']:>11.2f}"
+            f" {result['peak_rss_mb']:>7.1f}"
+        )
+    args.output.write_text(
+        json.dumps(
+            {
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "zlib": zlib.ZLIB_RUNTIME_VERSION,
+                "repeat": args.repeat,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"saved {len(results)} results to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
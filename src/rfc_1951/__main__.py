@@ -0,0 +1,169 @@
+"""
+Compress or decompress files in the gzip format, like gzip(1).
+
+usage: python -m rfc_1951 [-c] [-d] [-k] [-1 ... -9] [-p N] [--verbose] [file ...]
+"""
+import os
+import sys
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from io import BufferedIOBase, BytesIO
+from mmap import ACCESS_READ, mmap
+from time import perf_counter
+
+from rfc_1951.compress import DEFAULT_LEVEL, gzip, gzip_stream
+from rfc_1951.core import BitStream
+from rfc_1951.decompress import gunzip_stream
+
+SUFFIX = ".gz"
+# the write buffer for output files
+OUTPUT_BUFFER_SIZE = 2 ** 20
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog="python -m rfc_1951",
+        description=__doc__.strip().splitlines()[0],
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="files to compress or decompress in place, or - for stdin",
+    )
+    parser.add_argument(
+        "-c",
+        "--stdout",
+        action="store_true",
+        help="write to stdout and keep the input files",
+    )
+    parser.add_argument(
+        "-d", "--decompress", action="store_true", help="decompress"
+    )
+    parser.add_argument(
+        "-k", "--keep", action="store_true", help="keep the input files"
+    )
+    for level in range(1, 10):
+        parser.add_argument(
+            f"-{level}",
+            dest="level",
+            action="store_const",
+            const=level,
+            help="compression level, from -1 (fastest) to -9 (smallest)"
+            if level == 1
+            else SUPPRESS,
+        )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=1,
+        help="compress in this many processes",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="print the size and throughput for each file to stderr",
+    )
+    parser.set_defaults(level=DEFAULT_LEVEL)
+    return parser
+
+
+def open_input(path: str) -> tuple[BufferedIOBase | mmap, int]:
+    """
+    Return a file mapped into memory and its size, falling back to reading
+    it for stdin and files that can't be mapped.
+    """
+    if path == "-":
+        content_in = sys.stdin.buffer.read()
+        return BytesIO(content_in), len(content_in)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            return mmap(f.fileno(), 0, access=ACCESS_READ), size
+        except (ValueError, OSError):
+            # e.g. empty files can't be mapped
+            content_in = f.read()
+            return BytesIO(content_in), len(content_in)
+
+
+def get_output_path(path: str, decompress: bool) -> str:
+    if not decompress:
+        return path + SUFFIX
+    if not path.endswith(SUFFIX):
+        raise ValueError(f"unknown suffix, expected {SUFFIX}")
+    return path[: -len(SUFFIX)]
+
+
+def process(
+    content_in: BufferedIOBase | mmap, output: BufferedIOBase, args: Namespace
+) -> int:
+    """
+    Write the output for one input, returning the bytes written. Output is
+    written a piece at a time as it is produced, except when compressing
+    in several processes.
+    """
+    if args.processes > 1 and not args.decompress:
+        return output.write(
+            gzip(content_in, level=args.level, processes=args.processes)
+        )
+    if args.decompress:
+        chunks = gunzip_stream(BitStream(content_in))
+    else:
+        chunks = gzip_stream(content_in, level=args.level)
+    written = 0
+    for chunk in chunks:
+        written += output.write(chunk)
+    return written
+
+
+def convert(path: str, args: Namespace) -> tuple[int, int]:
+    """Compress or decompress one file, returning the bytes read and written."""
+    to_stdout = args.stdout or path == "-"
+    if not to_stdout:
+        output_path = get_output_path(path, args.decompress)
+    content_in, read = open_input(path)
+    try:
+        if to_stdout:
+            written = process(content_in, sys.stdout.buffer, args)
+            sys.stdout.buffer.flush()
+            return read, written
+        # "x" refuses to overwrite an existing file
+        output = open(output_path, "xb", buffering=OUTPUT_BUFFER_SIZE)
+        try:
+            with output:
+                written = process(content_in, output, args)
+        except BaseException:
+            os.remove(output_path)
+            raise
+    finally:
+        content_in.close()
+    if not args.keep:
+        os.remove(path)
+    return read, written
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+    status = 0
+    for path in args.files or ["-"]:
+        start = perf_counter()
+        try:
+            read, written = convert(path, args)
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            print(f"rfc_1951: {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        elapsed = perf_counter() - start
+        if args.verbose:
+            uncompressed = written if args.decompress else read
+            throughput = uncompressed / max(elapsed, 1e-9) / 2 ** 20
+            print(
+                f"{path}: {read} -> {written} bytes"
+                f" in {elapsed:.3f}s, {throughput:.2f} MB/s",
+                file=sys.stderr,
+            )
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
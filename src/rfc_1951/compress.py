@@ -1,143 +1,1167 @@
+from array import array
 from binascii import crc32
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from heapq import heapify, heappop, heappush
+from itertools import repeat
+from math import ceil
+from operator import mul
 from struct import pack
+from typing import Iterator
 
 from rfc_1951.core import *
 
-MAX_LOOKBACK = 2 ** 10
-MAX_LOOKAHEAD = 200
+HASH_BITS = 15
+HASH_SIZE = 2 ** HASH_BITS
+HASH_MASK = HASH_SIZE - 1
+# every byte is shifted out of the hash after Length.MIN_LENGTH updates
+HASH_SHIFT = ceil(HASH_BITS / Length.MIN_LENGTH)
+WINDOW_MASK = LZ77_MAX_LOOKBACK - 1
+NIL = -1
+MATCH_STEP = 16
+TOO_FAR = 4096
+BLOCK_SPLIT_TOKENS = 2 ** 12
+# the most tokens in one block, like the 16K symbol literal buffer of zlib
+MAX_BLOCK_TOKENS = 2 ** 14
+PARALLEL_CHUNK_SIZE = 2 ** 17
+DICTIONARY_SEGMENT_LENGTH = 8
+# dictionaries whose hash chains are kept by get_dictionary_finder
+DICTIONARY_FINDER_CACHE_SIZE = 8
+COMPRESSOR_BUFFER_SIZE = 2 ** 16
+# flush modes, with the same values as in zlib
+Z_NO_FLUSH = 0
+Z_SYNC_FLUSH = 2
+Z_FULL_FLUSH = 3
+Z_FINISH = 4
 
 
-def encode_no_compression(content_in: bytes, output: BitStream):
+def encode_no_compression(content_in: bytes, output: BitWriter):
     output.flush_byte()
-    block_len = len(content_in) & 0xFF
+    block_len = len(content_in) & 0xFFFF
     output.write(16, pack("<H", block_len))
     output.write(16, pack("<H", ~block_len % (2 ** 16)))
     output.write(8 * len(content_in), content_in)
 
 
-def get_length_distance(
-    content_in: bytes, index: int, hash_chain_map: dict[bytes, list[int]]
-) -> tuple[int, int]:
-    """Return a length, distance pair representing the most recent match.
-    :example: get_length_distance("abaaba", 3, {"aba": [0]}) -> (3, 3)
-    """
-    if index + Length.MIN_LENGTH > len(content_in):
-        # not worth run encoding
-        return 0, 0
-    if content_in[index : index + Length.MIN_LENGTH] not in hash_chain_map:
-        # no matches
-        return 0, 0
-    length_match = Length.MIN_LENGTH
-    hash_matches = hash_chain_map[
-        content_in[index : index + Length.MIN_LENGTH]
-    ]
-    for match in reversed(hash_matches):  # prefer recent matches
-        if index - match > MAX_LOOKBACK:
-            # outside of window
+@dataclass(frozen=True)
+class CompressionConfig:
+    """Match finder tuning for a compression level, as in zlib's deflate.c"""
+
+    # search a quarter as many chain entries once a match this long is found
+    good_length: int
+    # with lazy matching, don't look for a better match after a match this
+    # long; otherwise don't insert the strings inside matches this long
+    max_lazy: int
+    # stop searching once a match this long is found
+    nice_length: int
+    # the maximum number of hash chain entries to search
+    max_chain: int
+    # check whether the match starting at the next byte is longer before
+    # committing to a match
+    lazy: bool
+
+
+COMPRESSION_LEVELS = {
+    1: CompressionConfig(4, 4, 8, 4, lazy=False),
+    2: CompressionConfig(4, 5, 16, 8, lazy=False),
+    3: CompressionConfig(4, 6, 32, 32, lazy=False),
+    4: CompressionConfig(4, 4, 16, 16, lazy=True),
+    5: CompressionConfig(8, 16, 32, 32, lazy=True),
+    6: CompressionConfig(8, 16, 128, 128, lazy=True),
+    7: CompressionConfig(8, 32, 128, 256, lazy=True),
+    8: CompressionConfig(32, 128, 258, 1024, lazy=True),
+    9: CompressionConfig(32, 258, 258, 4096, lazy=True),
+}
+DEFAULT_LEVEL = 6
+
+
+class MatchFinder:
+    """
+    Find LZ77 matches with hash chains over a LZ77_MAX_LOOKBACK window.
+
+    head maps the rolling hash of the next MIN_LENGTH bytes to the most
+    recent position with that hash, and prev links each position in the
+    window to the previous position with the same hash.
+
+    Content can be added with extend, which slides out content that is too
+    far back to be matched, like zlib's fill_window.
+    """
+
+    def __init__(self, content_in: bytes, config: CompressionConfig):
+        self.content_in = content_in
+        self.config = config
+        self.head = array("q", [NIL]) * HASH_SIZE
+        self.prev = array("q", [NIL]) * LZ77_MAX_LOOKBACK
+        self.hash = 0
+        self.skip_to(0)
+
+    def extend(self, content_in: bytes) -> int:
+        """
+        Add content_in after the current content, and return the position it
+        starts at. Positions before it must all have been inserted or
+        skipped.
+        """
+        end = len(self.content_in)
+        # keep the last LZ77_MAX_LOOKBACK bytes, sliding by whole windows so
+        # prev stays indexed by position & WINDOW_MASK
+        delta = (end // LZ77_MAX_LOOKBACK - 1) * LZ77_MAX_LOOKBACK
+        if delta > 0:
+            self.content_in = self.content_in[delta:]
+            self.head = array("q", [max(p - delta, NIL) for p in self.head])
+            self.prev = array("q", [max(p - delta, NIL) for p in self.prev])
+            end -= delta
+        self.content_in += content_in
+        # the last positions couldn't be hashed before the content after them
+        start = max(end - Length.MIN_LENGTH + 1, 0)
+        self.skip_to(start)
+        for position in range(start, end):
+            self.insert(position)
+        return end
+
+    def copy(self, config: CompressionConfig | None = None) -> "MatchFinder":
+        """
+        Return a finder with the same content and hash chains, which can be
+        extended without changing this one.
+        """
+        other = type(self).__new__(type(self))
+        other.content_in = self.content_in
+        other.config = config or self.config
+        other.head = self.head[:]
+        other.prev = self.prev[:]
+        other.hash = self.hash
+        return other
+
+    def skip_to(self, position: int):
+        """Restart the rolling hash at position without inserting anything."""
+        if position + 1 < len(self.content_in):
+            self.hash = (
+                self.content_in[position] << HASH_SHIFT
+            ) ^ self.content_in[position + 1]
+
+    def insert(self, position: int) -> int:
+        """
+        Add position to its hash chain and return the previous head of the
+        chain. Positions must be inserted in order, or after skip_to.
+        """
+        if position + Length.MIN_LENGTH > len(self.content_in):
+            return NIL
+        self.hash = (
+            (self.hash << HASH_SHIFT)
+            ^ self.content_in[position + Length.MIN_LENGTH - 1]
+        ) & HASH_MASK
+        candidate = self.head[self.hash]
+        self.prev[position & WINDOW_MASK] = candidate
+        self.head[self.hash] = position
+        return candidate
+
+    def longest_match(
+        self,
+        position: int,
+        candidate: int,
+        prev_length: int = Length.MIN_LENGTH - 1,
+    ) -> tuple[int, int]:
+        """
+        Walk the hash chain starting at candidate for the longest match
+        with the content at position. Return (length, distance), or (0, 0)
+        if there is no match longer than prev_length.
+        """
+        content_in = self.content_in
+        prev = self.prev
+        chain = self.config.max_chain
+        if prev_length >= self.config.good_length:
+            chain >>= 2
+        max_length = min(Length.MAX_LENGTH, len(content_in) - position)
+        nice_length = min(self.config.nice_length, max_length)
+        # prev entries at or before limit may already be overwritten
+        limit = max(position - LZ77_MAX_LOOKBACK, NIL)
+        best_length, best_distance = prev_length, 0
+        while candidate > limit and chain:
+            chain -= 1
+            # the byte that would make this match the best one so far has
+            # to match, which rejects most candidates with one comparison
+            if (
+                best_length < max_length
+                and content_in[candidate + best_length]
+                == content_in[position + best_length]
+            ):
+                length = match_length(
+                    content_in, candidate, position, max_length
+                )
+                if length > best_length:
+                    best_length, best_distance = length, position - candidate
+                    if length >= nice_length:
+                        break
+            candidate = prev[candidate & WINDOW_MASK]
+        if not best_distance:
             return 0, 0
-        distance = index - match
-        length = Length.MIN_LENGTH
-        while (
-            index + length < len(content_in)
-            and content_in[index + length] == content_in[match + length]
-        ):
-            if length > length_match:
-                length_match = length
-                if length_match == Length.MAX_LENGTH:
-                    return length_match, distance
-            length += 1
-    return length, distance
+        return best_length, best_distance
 
 
-def encode_fixed_compression(content_in: bytes, output: BitStream):
-    index = 0
-    hash_chain_map = defaultdict(list)
+def match_length(
+    content_in: bytes, start: int, position: int, max_length: int
+) -> int:
+    """Return how many bytes from start match those from position."""
+    length = 0
+    # compare whole slices first so most of the scan happens in C
+    while (
+        length + MATCH_STEP <= max_length
+        and content_in[start + length : start + length + MATCH_STEP]
+        == content_in[position + length : position + length + MATCH_STEP]
+    ):
+        length += MATCH_STEP
+    while (
+        length < max_length
+        and content_in[start + length] == content_in[position + length]
+    ):
+        length += 1
+    return length
+
+
+@lru_cache(maxsize=DICTIONARY_FINDER_CACHE_SIZE)
+def get_dictionary_finder(dictionary: bytes) -> MatchFinder:
+    """
+    Return a MatchFinder with every position of dictionary inserted, shared
+    between calls with the same dictionary, so records compressed one at a
+    time don't each hash the dictionary again. The finder is only ever
+    copied, never extended.
+    """
+    finder = MatchFinder(dictionary, COMPRESSION_LEVELS[DEFAULT_LEVEL])
+    for position in range(len(dictionary)):
+        finder.insert(position)
+    return finder
+
+
+def find_tokens(finder: MatchFinder, start: int) -> list[tuple[int, int]]:
+    """
+    Run LZ77 over the content of finder from start, with the lazy or greedy
+    matching of its config.
+    """
+    if finder.config.lazy:
+        return find_lazy_tokens(finder, start)
+    return find_greedy_tokens(finder, start)
+
+
+def get_tokens(
+    content_in: bytes, level: int = DEFAULT_LEVEL, dictionary: bytes = b""
+) -> list[tuple[int, int]]:
+    """
+    Run LZ77 over content_in. Literals are returned as (byte, 0) and
+    matches as (length, distance).
+    :param dictionary: content that matches may refer back to, but that is
+        not part of the output
+    """
+    finder = get_dictionary_finder(bytes(dictionary[-LZ77_MAX_LOOKBACK:]))
+    finder = finder.copy(get_config(level))
+    return find_tokens(finder, finder.extend(content_in))
+
+
+def get_greedy_tokens(
+    content_in: bytes, config: CompressionConfig, start: int = 0
+) -> list[tuple[int, int]]:
+    """
+    Take the longest match at each position (zlib's deflate_fast).
+    :param start: where tokens start, earlier content is only matched against
+    """
+    finder = MatchFinder(content_in, config)
+    for position in range(start):
+        finder.insert(position)
+    return find_greedy_tokens(finder, start)
+
+
+def find_greedy_tokens(
+    finder: MatchFinder, start: int
+) -> list[tuple[int, int]]:
+    """
+    get_greedy_tokens over the content of finder, whose positions before
+    start have been inserted.
+    """
+    content_in = finder.content_in
+    config = finder.config
+    tokens = []
+    index = start
     while index < len(content_in):
-        if index - 1 >= 0 and index + Length.MIN_LENGTH - 1 < len(content_in):
-            hash_chain_map[
-                content_in[index - 1 : index + Length.MIN_LENGTH - 1]
-            ].append(index - 1)
-        length, distance = get_length_distance(
-            content_in, index, hash_chain_map
-        )
-        if not length and not distance:
-            output.write_code(
-                len(STATIC_LEN_CODES.encoding[content_in[index]]),
-                int(
-                    "".join(
-                        reversed(STATIC_LEN_CODES.encoding[content_in[index]])
-                    ),
-                    2,
-                ),
+        length, distance = finder.longest_match(index, finder.insert(index))
+        if not length:
+            tokens.append((content_in[index], 0))
+            index += 1
+            continue
+        tokens.append((length, distance))
+        if length <= config.max_lazy:
+            for position in range(index + 1, index + length):
+                finder.insert(position)
+        else:
+            finder.skip_to(index + length)
+        index += length
+    return tokens
+
+
+def get_lazy_tokens(
+    content_in: bytes, config: CompressionConfig, start: int = 0
+) -> list[tuple[int, int]]:
+    """
+    Defer each match by one byte, and emit a literal instead if the match
+    starting at the next byte is longer (zlib's deflate_slow).
+    :param start: where tokens start, earlier content is only matched against
+    """
+    finder = MatchFinder(content_in, config)
+    for position in range(start):
+        finder.insert(position)
+    return find_lazy_tokens(finder, start)
+
+
+def find_lazy_tokens(finder: MatchFinder, start: int) -> list[tuple[int, int]]:
+    """
+    get_lazy_tokens over the content of finder, whose positions before
+    start have been inserted.
+    """
+    content_in = finder.content_in
+    config = finder.config
+    tokens = []
+    prev_length = prev_distance = 0
+    # whether the byte before index still has to be emitted
+    is_pending = False
+    index = start
+    while index < len(content_in):
+        candidate = finder.insert(index)
+        length = distance = 0
+        if prev_length < config.max_lazy:
+            length, distance = finder.longest_match(
+                index, candidate, max(prev_length, Length.MIN_LENGTH - 1)
             )
+            if length == Length.MIN_LENGTH and distance > TOO_FAR:
+                # a far away 3 byte match costs more than the literals
+                length = distance = 0
+        if prev_length and not length:
+            # the previous match is at least as long, so take it
+            tokens.append((prev_length, prev_distance))
+            for position in range(index + 1, index - 1 + prev_length):
+                finder.insert(position)
+            index += prev_length - 1
+            prev_length = prev_distance = 0
+            is_pending = False
+        else:
+            if is_pending:
+                tokens.append((content_in[index - 1], 0))
+            prev_length, prev_distance = length, distance
+            is_pending = True
             index += 1
+    if is_pending:
+        tokens.append((content_in[-1], 0))
+    return tokens
+
+
+def get_config(level: int) -> CompressionConfig:
+    if level not in COMPRESSION_LEVELS:
+        raise ValueError(
+            f"Invalid compression level {level}. must be in range(1, 10)"
+        )
+    return COMPRESSION_LEVELS[level]
+
+
+def write_symbol(output: BitWriter, huffman: HuffmanEncoding, symbol: int):
+    output.write_code(
+        huffman.code_lengths[symbol], huffman.reversed_codes[symbol]
+    )
+
+
+def write_tokens(
+    tokens: list[tuple[int, int]],
+    output: BitWriter,
+    len_codes: HuffmanEncoding,
+    dist_codes: HuffmanEncoding,
+):
+    len_lengths, len_reversed = (
+        len_codes.code_lengths,
+        len_codes.reversed_codes,
+    )
+    dist_lengths = dist_codes.code_lengths
+    dist_reversed = dist_codes.reversed_codes
+    write_code = output.write_code
+    for value, distance in tokens:
+        if not distance:
+            write_code(len_lengths[value], len_reversed[value])
+            continue
+        # each symbol is written together with its extra bits
+        code = LENGTH_CODE[value]
+        write_code(
+            len_lengths[code] + LENGTH_EXTRA_BITS[code],
+            len_reversed[code]
+            | (value - LENGTH_BASE[code]) << len_lengths[code],
+        )
+        code = distance_code(distance)
+        write_code(
+            dist_lengths[code] + DISTANCE_EXTRA_BITS[code],
+            dist_reversed[code]
+            | (distance - DISTANCE_BASE[code]) << dist_lengths[code],
+        )
+    write_symbol(output, len_codes, CODE_END_OF_BLOCK)
+
+
+def encode_fixed_compression(tokens: list[tuple[int, int]], output: BitWriter):
+    write_tokens(tokens, output, STATIC_LEN_CODES, STATIC_DIST_CODES)
+
+
+def get_symbol_frequencies(
+    tokens: list[tuple[int, int]]
+) -> tuple[list[int], list[int]]:
+    """Count literal/length and distance symbols used by tokens."""
+    len_frequencies = [0] * 286
+    dist_frequencies = [0] * 30
+    for value, distance in tokens:
+        if not distance:
+            len_frequencies[value] += 1
         else:
-            length_encoded = Length.from_length(length)
-            output.write_code(
-                len(STATIC_LEN_CODES.encoding[length_encoded.code]),
-                int(
-                    "".join(
-                        reversed(
-                            STATIC_LEN_CODES.encoding[length_encoded.code]
-                        )
-                    ),
-                    2,
-                ),
+            len_frequencies[LENGTH_CODE[value]] += 1
+            dist_frequencies[distance_code(distance)] += 1
+    len_frequencies[CODE_END_OF_BLOCK] += 1
+    return len_frequencies, dist_frequencies
+
+
+def get_code_lengths(frequencies: list[int], max_bits: int) -> list[int]:
+    """
+    Return Huffman code lengths for the given symbol frequencies, with no
+    code longer than max_bits. Unused symbols get a length of 0.
+    """
+    frequencies = list(frequencies)
+    # Like zlib, always use at least two codes so that every alphabet has a
+    # complete code and no code is 0 bits long.
+    for symbol in range(len(frequencies)):
+        if sum(1 for frequency in frequencies if frequency) >= 2:
+            break
+        if not frequencies[symbol]:
+            frequencies[symbol] = 1
+    heap = [
+        (frequency, symbol, [symbol])
+        for symbol, frequency in enumerate(frequencies)
+        if frequency
+    ]
+    heapify(heap)
+    depths = [0] * len(frequencies)
+    while len(heap) > 1:
+        frequency_a, tiebreak, symbols_a = heappop(heap)
+        frequency_b, _, symbols_b = heappop(heap)
+        for symbol in symbols_a + symbols_b:
+            depths[symbol] += 1
+        heappush(
+            heap,
+            (frequency_a + frequency_b, tiebreak, symbols_a + symbols_b),
+        )
+    # Move overlong codes up the tree while keeping it complete: the two
+    # deepest leaves are replaced by their parent, and the freed sibling
+    # is hung under the deepest leaf that still has room (see Annex K.3 of
+    # the JPEG specification).
+    counts_by_length = [0] * (max(max(depths), max_bits) + 1)
+    for depth in depths:
+        if depth:
+            counts_by_length[depth] += 1
+    for bits in range(len(counts_by_length) - 1, max_bits, -1):
+        while counts_by_length[bits]:
+            shorter = bits - 2
+            while not counts_by_length[shorter]:
+                shorter -= 1
+            counts_by_length[bits] -= 2
+            counts_by_length[bits - 1] += 1
+            counts_by_length[shorter + 1] += 2
+            counts_by_length[shorter] -= 1
+    # Hand out the lengths again, giving the longest codes to the least
+    # frequent symbols.
+    code_lengths = [0] * len(frequencies)
+    symbols = sorted(
+        (symbol for symbol, depth in enumerate(depths) if depth),
+        key=lambda symbol: (frequencies[symbol], -depths[symbol]),
+    )
+    for bits in range(max_bits, 0, -1):
+        for _ in range(counts_by_length[bits]):
+            code_lengths[symbols.pop(0)] = bits
+    return code_lengths
+
+
+def get_code_code_runs(code_lengths: list[int]) -> list[tuple[int, int]]:
+    """
+    Run length encode code lengths with the code length alphabet, returning
+    (code, extra bits value) pairs.
+    """
+    runs = []
+    index = 0
+    while index < len(code_lengths):
+        code_length = code_lengths[index]
+        run = 1
+        while (
+            index + run < len(code_lengths)
+            and code_lengths[index + run] == code_length
+        ):
+            run += 1
+        index += run
+        if not code_length:
+            while run >= CodeCode.MIN_LENGTH[18]:
+                to_add = min(run, CodeCode.MIN_LENGTH[18] + 127)
+                runs.append((18, to_add - CodeCode.MIN_LENGTH[18]))
+                run -= to_add
+            if run >= CodeCode.MIN_LENGTH[17]:
+                runs.append((17, run - CodeCode.MIN_LENGTH[17]))
+                run = 0
+        else:
+            runs.append((code_length, 0))
+            run -= 1
+            while run >= CodeCode.MIN_LENGTH[16]:
+                to_add = min(run, CodeCode.MIN_LENGTH[16] + 3)
+                runs.append((16, to_add - CodeCode.MIN_LENGTH[16]))
+                run -= to_add
+        runs += [(code_length, 0)] * run
+    return runs
+
+
+@dataclass
+class DynamicHeader:
+    """The code trees sent at the start of a dynamic Huffman block."""
+
+    len_lengths: list[int]
+    dist_lengths: list[int]
+    code_lengths: list[int]
+    runs: list[tuple[int, int]]
+    n_len: int
+    n_dist: int
+    n_code: int
+
+    @classmethod
+    def from_frequencies(
+        cls, len_frequencies: list[int], dist_frequencies: list[int]
+    ) -> "DynamicHeader":
+        len_lengths = get_code_lengths(len_frequencies, 15)
+        dist_lengths = get_code_lengths(dist_frequencies, 15)
+        n_len = max(
+            257, max(i for i, length in enumerate(len_lengths) if length) + 1
+        )
+        n_dist = max(i for i, length in enumerate(dist_lengths) if length) + 1
+        runs = get_code_code_runs(len_lengths[:n_len] + dist_lengths[:n_dist])
+        code_frequencies = [0] * len(CODE_CODE_ORDER)
+        for code, _ in runs:
+            code_frequencies[code] += 1
+        code_lengths = get_code_lengths(code_frequencies, 7)
+        n_code = max(
+            4,
+            max(
+                i
+                for i, code in enumerate(CODE_CODE_ORDER)
+                if code_lengths[code]
             )
-            if length_encoded.extra_bits:
-                output.write_code(
-                    length_encoded.extra_bits,
-                    length_encoded.additional_content,
+            + 1,
+        )
+        return cls(
+            len_lengths,
+            dist_lengths,
+            code_lengths,
+            runs,
+            n_len,
+            n_dist,
+            n_code,
+        )
+
+    def size(self) -> int:
+        """Return the size of the header in bits."""
+        size = 5 + 5 + 4 + 3 * self.n_code
+        for code, _ in self.runs:
+            size += self.code_lengths[code] + CodeCode.EXTRA_BITS.get(code, 0)
+        return size
+
+    def write(self, output: BitWriter):
+        code_huffman = HuffmanEncoding.from_alphabet_code_lengths(
+            self.code_lengths
+        )
+        output.write_code(5, self.n_len - 257)
+        output.write_code(5, self.n_dist - 1)
+        output.write_code(4, self.n_code - 4)
+        for code in CODE_CODE_ORDER[: self.n_code]:
+            output.write_code(3, self.code_lengths[code])
+        for code, extra in self.runs:
+            write_symbol(output, code_huffman, code)
+            if code in CodeCode.EXTRA_BITS:
+                output.write_code(CodeCode(code).extra_bits, extra)
+
+
+def encode_dynamic_compression(
+    tokens: list[tuple[int, int]],
+    output: BitWriter,
+    header: DynamicHeader | None = None,
+):
+    if header is None:
+        header = DynamicHeader.from_frequencies(
+            *get_symbol_frequencies(tokens)
+        )
+    header.write(output)
+    write_tokens(
+        tokens,
+        output,
+        HuffmanEncoding.from_alphabet_code_lengths(header.len_lengths),
+        HuffmanEncoding.from_alphabet_code_lengths(header.dist_lengths),
+    )
+
+
+@dataclass
+class TokenBlock:
+    """
+    A run of tokens that will be written as one deflate block. Blocks are
+    ranges of a token list and of the content it encodes, which are only
+    sliced when the block is written, so merging blocks is cheap.
+    """
+
+    all_tokens: list[tuple[int, int]]
+    all_content: bytes
+    token_start: int
+    token_end: int
+    content_start: int
+    content_end: int
+    len_frequencies: list[int]
+    dist_frequencies: list[int]
+
+    @classmethod
+    def from_tokens(
+        cls,
+        tokens: list[tuple[int, int]],
+        content: bytes,
+        token_start: int = 0,
+        token_end: int | None = None,
+        content_start: int = 0,
+        content_end: int | None = None,
+    ) -> "TokenBlock":
+        token_end = len(tokens) if token_end is None else token_end
+        content_end = len(content) if content_end is None else content_end
+        return cls(
+            tokens,
+            content,
+            token_start,
+            token_end,
+            content_start,
+            content_end,
+            *get_symbol_frequencies(tokens[token_start:token_end]),
+        )
+
+    @property
+    def tokens(self) -> list[tuple[int, int]]:
+        return self.all_tokens[self.token_start : self.token_end]
+
+    @property
+    def content(self) -> bytes:
+        return self.all_content[self.content_start : self.content_end]
+
+    @property
+    def num_tokens(self) -> int:
+        return self.token_end - self.token_start
+
+    def merge(self, other: "TokenBlock") -> "TokenBlock":
+        """Return the block of self followed by other, which must follow it."""
+        if (other.token_start, other.content_start) != (
+            self.token_end,
+            self.content_end,
+        ):
+            raise ValueError("Can only merge a block with the block after it")
+        len_frequencies = [
+            a + b for a, b in zip(self.len_frequencies, other.len_frequencies)
+        ]
+        # both blocks counted their own end of block code
+        len_frequencies[CODE_END_OF_BLOCK] -= 1
+        return TokenBlock(
+            self.all_tokens,
+            self.all_content,
+            self.token_start,
+            other.token_end,
+            self.content_start,
+            other.content_end,
+            len_frequencies,
+            [
+                a + b
+                for a, b in zip(self.dist_frequencies, other.dist_frequencies)
+            ],
+        )
+
+    def extra_bits_size(self) -> int:
+        return sum(map(mul, self.len_frequencies, LENGTH_EXTRA_BITS)) + sum(
+            map(mul, self.dist_frequencies, DISTANCE_EXTRA_BITS)
+        )
+
+    def stored_size(self) -> int:
+        """Return the size in bits as stored blocks, ignoring alignment."""
+        content_len = self.content_end - self.content_start
+        num_blocks = max(1, ceil(content_len / NON_COMPRESSABLE_MAX_SIZE))
+        return 8 * (content_len + 4 * num_blocks)
+
+    def fixed_size(self) -> int:
+        return (
+            sum(
+                map(
+                    mul,
+                    self.len_frequencies,
+                    STATIC_LEN_CODES.alphabet_code_lengths,
                 )
-            distance_encoded = Distance.from_distance(distance)
-            output.write_code(
-                len(STATIC_DIST_CODES.encoding[distance_encoded.code]),
-                int(
-                    "".join(
-                        reversed(
-                            STATIC_DIST_CODES.encoding[distance_encoded.code]
-                        )
-                    ),
-                    2,
-                ),
             )
-            if distance_encoded.extra_bits:
-                output.write_code(
-                    distance_encoded.extra_bits,
-                    distance_encoded.additional_content,
-                )
-            index += length
+            + 5 * sum(self.dist_frequencies)
+            + self.extra_bits_size()
+        )
 
-    output.write(
-        len(STATIC_LEN_CODES.encoding[CODE_END_OF_BLOCK]),
-        int(
-            "".join(reversed(STATIC_LEN_CODES.encoding[CODE_END_OF_BLOCK])), 2
-        ),
-    )
+    def dynamic_header(self) -> DynamicHeader:
+        return DynamicHeader.from_frequencies(
+            self.len_frequencies, self.dist_frequencies
+        )
 
+    def dynamic_size(self, header: DynamicHeader | None = None) -> int:
+        header = header or self.dynamic_header()
+        return (
+            header.size()
+            + sum(map(mul, self.len_frequencies, header.len_lengths))
+            + sum(map(mul, self.dist_frequencies, header.dist_lengths))
+            + self.extra_bits_size()
+        )
 
-def encode(stream: BufferedIOBase, block_type: BlockType) -> bytes:
-    output = BitStream(b"")
-    content_in = stream.read()
-    output.write(1, 1)
-    output.write(2, block_type.value)
+
+def split_tokens(
+    tokens: list[tuple[int, int]], content_in: bytes
+) -> list[TokenBlock]:
+    """
+    Group tokens into blocks. Tokens are cut into BLOCK_SPLIT_TOKENS sized
+    segments, and neighbouring segments are merged for as long as sharing
+    one set of dynamic codes is cheaper than paying for a second header,
+    up to MAX_BLOCK_TOKENS tokens per block.
+    """
+    segments = []
+    position = 0
+    for start in range(0, len(tokens), BLOCK_SPLIT_TOKENS):
+        end = min(start + BLOCK_SPLIT_TOKENS, len(tokens))
+        size = sum(
+            value if distance else 1 for value, distance in tokens[start:end]
+        )
+        segments.append(
+            TokenBlock.from_tokens(
+                tokens, content_in, start, end, position, position + size
+            )
+        )
+        position += size
+    if not segments:
+        return [TokenBlock.from_tokens([], b"")]
+    blocks = [segments[0]]
+    current_size = segments[0].dynamic_size()
+    for segment in segments[1:]:
+        segment_size = segment.dynamic_size()
+        if blocks[-1].num_tokens + segment.num_tokens > MAX_BLOCK_TOKENS:
+            blocks.append(segment)
+            current_size = segment_size
+            continue
+        merged = blocks[-1].merge(segment)
+        merged_size = merged.dynamic_size()
+        if merged_size <= current_size + segment_size:
+            blocks[-1] = merged
+            current_size = merged_size
+        else:
+            blocks.append(segment)
+            current_size = segment_size
+    return blocks
+
+
+def encode_block(
+    block: TokenBlock,
+    output: BitWriter,
+    is_final: bool,
+    block_type: BlockType | None = None,
+):
+    """
+    Write block with block_type, or with whichever type is smallest if
+    block_type is None.
+    """
+    header = None
+    if block_type is None:
+        header = block.dynamic_header()
+        sizes = {
+            BlockType.NO_COMPRESSION: block.stored_size(),
+            BlockType.FIXED_HUFFMAN_COMPRESSION: block.fixed_size(),
+            BlockType.DYNAMIC_HUFFMAN_COMPRESSION: block.dynamic_size(header),
+        }
+        block_type = min(sizes, key=sizes.get)
     if block_type == BlockType.NO_COMPRESSION:
-        encode_no_compression(content_in, output)
-    elif block_type == BlockType.FIXED_HUFFMAN_COMPRESSION:
-        encode_fixed_compression(content_in, output)
+        encode_stored_blocks(block.content, output, is_final)
+        return
+    output.write(1, int(is_final))
+    output.write(2, block_type.value)
+    if block_type == BlockType.FIXED_HUFFMAN_COMPRESSION:
+        encode_fixed_compression(block.tokens, output)
+    elif block_type == BlockType.DYNAMIC_HUFFMAN_COMPRESSION:
+        encode_dynamic_compression(block.tokens, output, header)
     else:
         raise ValueError(f"requested unsupported block_type {block_type}")
-    output.flush_byte()
-    output.write(32, pack("<I", crc32(content_in)))
-    output.write(32, pack("<I", len(content_in)))
-    return output.underlying.getvalue()
 
 
-def gzip(
+def encode_stored_blocks(content_in: bytes, output: BitWriter, is_final: bool):
+    """Write content_in as stored blocks of at most NON_COMPRESSABLE_MAX_SIZE."""
+    start = 0
+    while True:
+        end = start + NON_COMPRESSABLE_MAX_SIZE
+        output.write(1, int(is_final and end >= len(content_in)))
+        output.write(2, BlockType.NO_COMPRESSION.value)
+        encode_no_compression(content_in[start:end], output)
+        if end >= len(content_in):
+            return
+        start = end
+
+
+def deflate(
+    content_in: bytes,
+    block_type: BlockType | None = None,
+    level: int = DEFAULT_LEVEL,
+    dictionary: bytes = b"",
+    is_final: bool = True,
+) -> bytes:
+    """
+    Compress content_in to a raw deflate stream.
+    :param block_type: the type used for every block, or None to pick the
+        smallest type for each block
+    :param level: 1 (fastest) to 9 (smallest output), as in zlib
+    :param dictionary: content preceding content_in that matches may refer to
+    :param is_final: if False, end with a sync flush (an empty stored block)
+        instead of a final block, so more deflate output can be appended
+    """
+    output = BitWriter()
+    encode_blocks(content_in, output, block_type, level, dictionary, is_final)
+    if not is_final:
+        encode_stored_blocks(b"", output, False)
+    return output.getvalue()
+
+
+def encode_blocks(
+    content_in: bytes,
+    output: BitWriter,
+    block_type: BlockType | None,
+    level: int,
+    dictionary: bytes,
+    is_final: bool,
+    finder: MatchFinder | None = None,
+):
+    """
+    Write content_in as one or more blocks, the last final if is_final.
+    :param finder: a MatchFinder over the content before content_in, which
+        is extended with content_in and matched against instead of
+        dictionary
+    """
+    if block_type == BlockType.NO_COMPRESSION:
+        encode_stored_blocks(content_in, output, is_final)
+    elif block_type == BlockType.RESERVED_ERROR:
+        raise ValueError(f"requested unsupported block_type {block_type}")
+    else:
+        if finder is None:
+            tokens = get_tokens(content_in, level, dictionary)
+        else:
+            tokens = find_tokens(finder, finder.extend(content_in))
+        blocks = split_tokens(tokens, content_in)
+        for i, block in enumerate(blocks):
+            encode_block(
+                block,
+                output,
+                is_final and i == len(blocks) - 1,
+                block_type,
+            )
+
+
+def build_dictionary(
+    samples: list[bytes],
+    size: int = LZ77_MAX_LOOKBACK,
+    segment_length: int = DICTIONARY_SEGMENT_LENGTH,
+) -> bytes:
+    """
+    Build a preset dictionary for compressing data like samples, e.g. small
+    records that share keys and values but are compressed one at a time.
+    The dictionary is made of the substrings shared by the most samples,
+    with the most common last, where distances to them are shortest.
+    :param size: the most bytes to return, at most LZ77_MAX_LOOKBACK
+    :param segment_length: the length of the substrings counted
+    """
+    size = min(size, LZ77_MAX_LOOKBACK)
+    counts = Counter()
+    for sample in samples:
+        counts.update(
+            {
+                sample[i : i + segment_length]
+                for i in range(len(sample) - segment_length + 1)
+            }
+        )
+    # the most common segment continuing or leading up to each substring
+    following, preceding = {}, {}
+    for segment, count in counts.items():
+        if count < 2:
+            continue
+        for overlaps, overlap in (
+            (following, segment[:-1]),
+            (preceding, segment[1:]),
+        ):
+            if count > counts[overlaps.get(overlap, b"")]:
+                overlaps[overlap] = segment
+    used = set()
+    strings = []
+    dictionary_len = 0
+    for segment, count in counts.most_common():
+        # a substring in only one sample doesn't help any other sample
+        if count < 2 or dictionary_len >= size:
+            break
+        if segment in used:
+            continue
+        # grow the segment into the longest string whose overlapping
+        # substrings are all in at least half as many samples
+        used.add(segment)
+        string = edge = segment
+        while (
+            (other := following.get(edge[1:]))
+            and other not in used
+            and 2 * counts[other] >= count
+        ):
+            used.add(other)
+            string += other[-1:]
+            edge = other
+        edge = segment
+        while (
+            (other := preceding.get(edge[:-1]))
+            and other not in used
+            and 2 * counts[other] >= count
+        ):
+            used.add(other)
+            string = other[:1] + string
+            edge = other
+        strings.append(string)
+        dictionary_len += len(string)
+    # most common strings last
+    return b"".join(reversed(strings))[-size:]
+
+
+def compress_raw(
+    content_in: bytes, level: int = DEFAULT_LEVEL, dictionary: bytes = b""
+) -> bytes:
+    """
+    Compress content_in to a raw deflate stream, with no header or trailer.
+    :param level: 1 (fastest) to 9 (smallest output), as in zlib
+    :param dictionary: a preset dictionary that matches may refer back to
+    """
+    return deflate(content_in, level=level, dictionary=dictionary)
+
+
+def zlib_compress(
+    content_in: bytes, level: int = DEFAULT_LEVEL, dictionary: bytes = b""
+) -> bytes:
+    """
+    Compress content_in to a zlib stream (RFC 1950), as used by PNG and the
+    HTTP deflate content-encoding: a 2 byte header, the deflate stream and
+    the Adler-32 of content_in.
+    :param level: 1 (fastest) to 9 (smallest output), as in zlib
+    :param dictionary: a preset dictionary, which the header identifies by
+        its Adler-32
+    """
+    # FLEVEL, which is only informative, set the way zlib does
+    if level < 2:
+        flags = 0
+    elif level < 6:
+        flags = 1 << 6
+    elif level == 6:
+        flags = 2 << 6
+    else:
+        flags = 3 << 6
+    if dictionary:
+        flags |= ZLIB_FDICT
+    # FCHECK makes the header a multiple of 31
+    flags |= (31 - (ZLIB_CMF << 8 | flags) % 31) % 31
+    header = bytes([ZLIB_CMF, flags])
+    if dictionary:
+        header += pack(">I", adler32(dictionary))
+    return (
+        header
+        + deflate(content_in, level=level, dictionary=dictionary)
+        + pack(">I", adler32(content_in))
+    )
+
+
+class Compressor:
+    """
+    Compress a raw deflate stream a piece at a time, like zlib's compressobj.
+    Input is compressed once COMPRESSOR_BUFFER_SIZE bytes have been given or
+    on a flush. One MatchFinder is kept across pieces, so later input can
+    still refer back to the last LZ77_MAX_LOOKBACK bytes without hashing
+    them again.
+    """
+
+    def __init__(
+        self,
+        level: int = DEFAULT_LEVEL,
+        dictionary: bytes = b"",
+        block_type: BlockType | None = None,
+    ):
+        """
+        :param level: 1 (fastest) to 9 (smallest output), as in zlib
+        :param dictionary: a preset dictionary that matches may refer to
+        :param block_type: the type used for every block, or None to pick
+            the smallest type for each block
+        """
+        self.config = get_config(level)
+        self.level = level
+        self.block_type = block_type
+        self.finder = get_dictionary_finder(
+            bytes(dictionary[-LZ77_MAX_LOOKBACK:])
+        ).copy(self.config)
+        self.unprocessed = bytearray()
+        self.output = BitWriter()
+        self.is_finished = False
+
+    def compress(self, content_in: bytes) -> bytes:
+        """Add content_in, returning whatever compressed output is ready."""
+        if self.is_finished:
+            raise ValueError("compressor was already flushed with Z_FINISH")
+        self.unprocessed += content_in
+        if len(self.unprocessed) >= COMPRESSOR_BUFFER_SIZE:
+            self._compress_unprocessed(False)
+        return self.output.take_bytes()
+
+    def flush(self, mode: int = Z_FINISH) -> bytes:
+        """
+        Compress all input given so far and return the remaining output.
+        :param mode: Z_SYNC_FLUSH ends the output on a byte boundary with an
+            empty stored block, so the receiver can decode everything so far.
+            Z_FULL_FLUSH also stops later input from referring to earlier
+            input, so decoding can restart from this point. Z_FINISH writes
+            the final block, after which no more input is accepted.
+        """
+        if self.is_finished:
+            raise ValueError("compressor was already flushed with Z_FINISH")
+        if mode == Z_NO_FLUSH:
+            return b""
+        if mode not in (Z_SYNC_FLUSH, Z_FULL_FLUSH, Z_FINISH):
+            raise ValueError(f"Invalid flush mode {mode}")
+        self._compress_unprocessed(mode == Z_FINISH)
+        if mode == Z_FINISH:
+            self.is_finished = True
+            self.output.flush_byte()
+        else:
+            encode_stored_blocks(b"", self.output, False)
+        if mode == Z_FULL_FLUSH:
+            self.finder = MatchFinder(b"", self.config)
+        return self.output.take_bytes()
+
+    def _compress_unprocessed(self, is_final: bool):
+        content_in = bytes(self.unprocessed)
+        if content_in or is_final:
+            encode_blocks(
+                content_in,
+                self.output,
+                self.block_type,
+                self.level,
+                b"",
+                is_final,
+                self.finder,
+            )
+        self.unprocessed.clear()
+
+
+def get_chunk_dictionary(
+    content_in: bytes, dictionary: bytes, start: int
+) -> bytes:
+    """
+    Return the LZ77_MAX_LOOKBACK bytes before the chunk of content_in at
+    start, reaching back into dictionary for the first chunks. Only the
+    window is sliced, so preparing every chunk takes constant time.
+    """
+    window = content_in[max(0, start - LZ77_MAX_LOOKBACK) : start]
+    if len(window) < LZ77_MAX_LOOKBACK and dictionary:
+        window = dictionary[len(window) - LZ77_MAX_LOOKBACK :] + window
+    return window
+
+
+def deflate_chunk(
+    content_in: bytes,
+    dictionary: bytes,
+    is_final: bool,
+    block_type: BlockType | None,
+    level: int,
+) -> tuple[bytes, int]:
+    """Return the deflated chunk and its CRC32 (run in worker processes)."""
+    return (
+        deflate(content_in, block_type, level, dictionary, is_final),
+        crc32(content_in),
+    )
+
+
+def encode(
     stream: BufferedIOBase,
-    block_type: BlockType = BlockType.FIXED_HUFFMAN_COMPRESSION,
+    block_type: BlockType | None = None,
+    level: int = DEFAULT_LEVEL,
+    processes: int = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    dictionary: bytes = b"",
 ) -> bytes:
+    """
+    Return the deflated stream followed by the gzip trailer.
+    :param dictionary: a preset dictionary, e.g. from build_dictionary, that
+        matches may refer back to. The same dictionary must be given to
+        decode.
+    :param processes: if more than 1, compress chunk_size pieces of the
+        stream in that many processes, each primed with the
+        LZ77_MAX_LOOKBACK bytes before it, and join them at sync flushes
+    """
+    content_in = stream.read()
+    if processes > 1 and len(content_in) > chunk_size:
+        starts = range(0, len(content_in), chunk_size)
+        with ProcessPoolExecutor(processes) as executor:
+            chunks = list(
+                executor.map(
+                    deflate_chunk,
+                    (content_in[i : i + chunk_size] for i in starts),
+                    (
+                        get_chunk_dictionary(content_in, dictionary, i)
+                        for i in starts
+                    ),
+                    (i + chunk_size >= len(content_in) for i in starts),
+                    repeat(block_type),
+                    repeat(level),
+                )
+            )
+        deflated = b"".join(chunk for chunk, _ in chunks)
+        crc = 0
+        for i, (_, chunk_crc) in zip(starts, chunks):
+            crc = crc32_combine(
+                crc, chunk_crc, min(chunk_size, len(content_in) - i)
+            )
+    else:
+        deflated = deflate(content_in, block_type, level, dictionary)
+        crc = crc32(content_in)
+    return deflated + pack("<II", crc, len(content_in) & 0xFFFFFFFF)
+
+
+def get_gzip_header() -> bytes:
     header = FileHeader(OS.UNKNOWN, datetime.now())
     header.crc = crc32(header.to_bytes()) & 0x0000FFFF
-    return header.to_bytes() + encode(stream, block_type)
+    return header.to_bytes()
+
+
+def gzip(
+    stream: BufferedIOBase,
+    block_type: BlockType | None = None,
+    level: int = DEFAULT_LEVEL,
+    processes: int = 1,
+) -> bytes:
+    return get_gzip_header() + encode(stream, block_type, level, processes)
+
+
+def gzip_stream(
+    stream: BufferedIOBase,
+    block_type: BlockType | None = None,
+    level: int = DEFAULT_LEVEL,
+    read_size: int = COMPRESSOR_BUFFER_SIZE,
+) -> Iterator[bytes]:
+    """
+    Compress stream to a gzip file, yielding the header, the output for
+    every read_size bytes of input and the trailer, so neither the input
+    nor the output is ever held whole.
+    """
+    compressor = Compressor(level, block_type=block_type)
+    yield get_gzip_header()
+    crc = size = 0
+    while content_in := stream.read(read_size):
+        crc = crc32(content_in, crc)
+        size += len(content_in)
+        if compressed := compressor.compress(content_in):
+            yield compressed
+    yield compressor.flush()
+    yield pack("<II", crc, size & 0xFFFFFFFF)
@@ -4,6 +4,14 @@ MAX_DUPLICATED_LENGTH = 258
 CODE_END_OF_BLOCK = 256
 GZIP_FILE_ID = bytes.fromhex("1f8b")
 COMPRESSION_METHOD = b"\x08"
+CRC32_POLYNOMIAL = 0xEDB88320
+# deflate with a 32 KiB window, the only method RFC 1950 defines
+ZLIB_CMF = 0x78
+ZLIB_FDICT = 0x20
+ADLER32_MODULUS = 65521
+# the most bytes summed before s2 has to be reduced to fit 32 bits in zlib,
+# which here keeps the sums small ints
+ADLER32_NMAX = 5552
 CODE_CODE_ORDER = [
     16,
     17,
@@ -26,11 +34,13 @@ CODE_CODE_ORDER = [
     15,
 ]
 
+from bisect import bisect_right
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from io import BufferedIOBase, BytesIO
+from itertools import accumulate
 from math import ceil, floor, log2
 from struct import pack
 from typing import Union
@@ -39,14 +49,24 @@ from typing import Union
 class BitStream:
     """
     A thin wrapper around a byte stream that allows reading bits instead of bytes.
+
+    The underlying stream is read READ_SIZE bytes at a time, and up to
+    BUFFER_BITS are moved from that chunk into an int bit buffer at once.
     """
 
+    READ_SIZE = 2 ** 16
+    BUFFER_BITS = 64
+
     def __init__(self, underlying: Union[bytes, BufferedIOBase]):
         if isinstance(underlying, bytes):
             underlying = BytesIO(underlying)
         self.underlying = underlying
         self.num_bits = 0
         self.buffer = 0b00000000
+        # the last chunk read from underlying and the next unread byte in it
+        self.chunk = b""
+        self.position = 0
+        self.bytes_read = 0
 
     def _get_buffered_bits(self, n: int) -> int:
         """Return extracted bits as an int."""
@@ -56,39 +76,106 @@ class BitStream:
         self.num_bits -= n
         return out
 
-    def _buffer_byte(self):
-        self.buffer += (
-            int.from_bytes(self.underlying.read(1), "big") << self.num_bits
-        )
-        self.num_bits += 8
+    def _read_chunk(self) -> bool:
+        """Replace the exhausted chunk, returning False at the end of the stream."""
+        self.chunk = self.underlying.read(self.READ_SIZE)
+        self.position = 0
+        self.bytes_read += len(self.chunk)
+        return bool(self.chunk)
+
+    def _fill_buffer(self, n: int):
+        """Buffer at least n bits, or as many as the stream has left."""
+        while self.num_bits < n:
+            if self.position >= len(self.chunk) and not self._read_chunk():
+                return
+            to_read = max(1, (self.BUFFER_BITS - self.num_bits) // 8)
+            end = self.position + to_read
+            self.buffer |= (
+                int.from_bytes(self.chunk[self.position : end], "little")
+                << self.num_bits
+            )
+            end = min(end, len(self.chunk))
+            self.num_bits += 8 * (end - self.position)
+            self.position = end
+
+    def tell(self) -> int:
+        """Return the number of bits read from the stream so far."""
+        unread = len(self.chunk) - self.position
+        return 8 * (self.bytes_read - unread) - self.num_bits
+
+    def at_end(self) -> bool:
+        """Return whether every bit of the stream has been read."""
+        if not self.num_bits:
+            self._fill_buffer(1)
+        return not self.num_bits
 
     def clear_buffer(self):
         """Useful for ignoring partial bytes"""
-        self.num_bits = 0
-        self.buffer = 0b00000000
+        self.consume(self.num_bits % 8)
+
+    def peek(self, n: int) -> int:
+        """
+        Return the next n bits as an int without consuming them. Bits past
+        the end of the stream read as 0.
+        """
+        if self.num_bits < n:
+            self._fill_buffer(n)
+        return self.buffer & ((1 << n) - 1)
+
+    def consume(self, n: int):
+        """Drop n bits that were previously inspected with peek."""
+        if n > self.num_bits:
+            raise EOFError("unexpected end of stream")
+        self.buffer >>= n
+        self.num_bits -= n
 
     def read_huffman_bits(self, huffman: "HuffmanEncoding") -> int:
-        """Return a value decoded from a Huffman tree, or throw a KeyError if not possible"""
-        node = huffman.node
-        while node and node.value is None:
-            node = node.children.get(self.read(1))
-        if not node:
+        """Return a value decoded from a Huffman table, or throw a KeyError if not possible"""
+        bits = self.peek(huffman.max_bits)
+        value, length = huffman.table[bits & huffman.root_mask]
+        if length < 0:
+            # value is the offset of a second level table indexed by the
+            # bits following the root bits
+            value, length = huffman.table[
+                value + ((bits >> huffman.root_bits) & ((1 << -length) - 1))
+            ]
+        if not length:
             raise KeyError("stream does not have a valid code")
-        return node.value
+        self.consume(length)
+        return value
+
+    def read_view(self, n: int) -> memoryview:
+        """
+        Return the next n bytes of a byte aligned stream. When they are all
+        in the current chunk, this is a view of the chunk rather than a copy.
+        """
+        if self.num_bits % 8:
+            raise ValueError("Cannot read bytes from an unaligned stream")
+        if not self.num_bits and self.position + n <= len(self.chunk):
+            self.position += n
+            return memoryview(self.chunk)[self.position - n : self.position]
+        # whole bytes may already be buffered from a peek
+        buffered = min(self.num_bits, 8 * n)
+        out = bytearray(
+            self._get_buffered_bits(buffered).to_bytes(buffered // 8, "little")
+        )
+        while len(out) < n:
+            if self.position >= len(self.chunk) and not self._read_chunk():
+                raise EOFError("unexpected end of stream")
+            end = self.position + n - len(out)
+            out += self.chunk[self.position : end]
+            self.position = min(end, len(self.chunk))
+        return memoryview(out)
 
     def read(self, n: int, prefer_bytes: bool = True) -> Union[bytes, int]:
-        if prefer_bytes and not self.num_bits and n % 8 == 0:
-            out = b""
-            to_read = n // 8
-            while to_read:
-                out += self.underlying.read(1)
-                to_read -= 1
-            return out
-        if (n + self.num_bits) not in range(33):
+        if prefer_bytes and not self.num_bits % 8 and n % 8 == 0:
+            return bytes(self.read_view(n // 8))
+        if n > 32:
             raise ValueError("Cannot buffer more than 32 bits")
-        to_get = n
-        while self.num_bits < n:
-            self._buffer_byte()
+        if self.num_bits < n:
+            self._fill_buffer(n)
+            if self.num_bits < n:
+                raise EOFError("unexpected end of stream")
         return self._get_buffered_bits(n)
 
     def write_code(self, n: int, content: int):
@@ -98,10 +185,7 @@ class BitStream:
         if isinstance(content, bytes) and n % 8:
             raise ValueError("Cannot write partial byte")
         if prefer_bytes and not self.num_bits and n % 8 == 0:
-            for i in range(len(content)):
-                self.underlying = BytesIO(
-                    self.underlying.getvalue() + content[i : i + 1]
-                )
+            self.underlying.write(content)
         else:
             while n:
                 if isinstance(content, bytes):
@@ -120,9 +204,7 @@ class BitStream:
 
     def flush_byte(self):
         if self.num_bits:
-            self.underlying = BytesIO(
-                self.underlying.getvalue() + pack("B", self.buffer & 0xFF)
-            )
+            self.underlying.write(pack("B", self.buffer & 0xFF))
         self.num_bits = max(0, self.num_bits - 8)
         self.buffer = self.buffer >> 8
 
@@ -131,6 +213,155 @@ class BitStream:
             self.flush_byte()
 
 
+class BitWriter(BitStream):
+    """
+    A BitStream for writing. Bits are collected in an int accumulator that
+    is emitted a whole word at a time into a bytearray, which is handed to
+    the underlying stream every FLUSH_SIZE bytes.
+    """
+
+    WORD_BITS = 64
+    FLUSH_SIZE = 2 ** 16
+
+    def __init__(self, underlying: Union[BufferedIOBase, None] = None):
+        super().__init__(BytesIO() if underlying is None else underlying)
+        self.pending = bytearray()
+
+    def write_code(self, n: int, content: int):
+        """Write the n low bits of content, which must be below 2 ** n."""
+        self.buffer |= content << self.num_bits
+        self.num_bits += n
+        if self.num_bits >= self.WORD_BITS:
+            self.pending += (
+                self.buffer & ((1 << self.WORD_BITS) - 1)
+            ).to_bytes(self.WORD_BITS // 8, "little")
+            self.buffer >>= self.WORD_BITS
+            self.num_bits -= self.WORD_BITS
+            if len(self.pending) >= self.FLUSH_SIZE:
+                self.underlying.write(self.pending)
+                self.pending.clear()
+
+    def write(self, n: int, content: bytes | int, prefer_bytes: bool = True):
+        if isinstance(content, int):
+            self.write_code(n, content & ((1 << n) - 1))
+        elif n != 8 * len(content):
+            raise ValueError("Cannot write partial byte")
+        else:
+            self.write_bytes(content)
+
+    def write_bytes(self, content: bytes):
+        """Write whole bytes, copying them directly if the stream is aligned."""
+        if self.num_bits % 8:
+            self.write_code(
+                8 * len(content), int.from_bytes(content, "little")
+            )
+            return
+        self._write_buffered_bytes()
+        self.pending += content
+        if len(self.pending) >= self.FLUSH_SIZE:
+            self.underlying.write(self.pending)
+            self.pending.clear()
+
+    def _write_buffered_bytes(self):
+        self.pending += self.buffer.to_bytes(
+            (self.num_bits + 7) // 8, "little"
+        )
+        self.buffer = 0
+        self.num_bits = 0
+
+    def flush_byte(self):
+        """Pad the stream with 0 bits up to the next byte boundary."""
+        self.num_bits += -self.num_bits % 8
+
+    def flush(self):
+        """Write everything so far to the underlying stream, padding the last byte."""
+        self._write_buffered_bytes()
+        self.underlying.write(self.pending)
+        self.pending.clear()
+
+    def getvalue(self) -> bytes:
+        self.flush()
+        return self.underlying.getvalue()
+
+    def take_bytes(self) -> bytes:
+        """
+        Return the whole bytes written since the last call and remove them
+        from the underlying BytesIO, keeping any partial byte buffered.
+        """
+        whole_bits = self.num_bits - self.num_bits % 8
+        self.pending += (self.buffer & ((1 << whole_bits) - 1)).to_bytes(
+            whole_bits // 8, "little"
+        )
+        self.buffer >>= whole_bits
+        self.num_bits -= whole_bits
+        out = self.underlying.getvalue() + self.pending
+        self.underlying.seek(0)
+        self.underlying.truncate()
+        self.pending.clear()
+        return out
+
+
+def multiply_mod_crc_polynomial(a: int, b: int) -> int:
+    """Multiply two polynomials modulo the bit reflected CRC-32 polynomial."""
+    product = 0
+    bit = 1 << 31
+    while a:
+        if a & bit:
+            product ^= b
+            a ^= bit
+        bit >>= 1
+        b = (b >> 1) ^ CRC32_POLYNOMIAL if b & 1 else b >> 1
+    return product
+
+
+# x ** (2 ** n) modulo the CRC-32 polynomial, starting from x ** 1
+X_POW_2N_MOD_POLYNOMIAL = [1 << 30]
+for _ in range(31):
+    X_POW_2N_MOD_POLYNOMIAL.append(
+        multiply_mod_crc_polynomial(
+            X_POW_2N_MOD_POLYNOMIAL[-1], X_POW_2N_MOD_POLYNOMIAL[-1]
+        )
+    )
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """
+    Return the CRC-32 of two concatenated byte strings, given the CRC-32 of
+    each and the length of the second. Appending len2 bytes multiplies the
+    first CRC by x ** (8 * len2), which is built from the table of
+    x ** (2 ** n) (see crc32_combine in zlib's crc32.c).
+    """
+    shift = 1 << 31  # x ** 0
+    n = 3  # len2 counts bytes, so start from x ** (2 ** 3)
+    while len2:
+        if len2 & 1:
+            shift = multiply_mod_crc_polynomial(
+                X_POW_2N_MOD_POLYNOMIAL[n & 31], shift
+            )
+        len2 >>= 1
+        n += 1
+    return multiply_mod_crc_polynomial(shift, crc1) ^ crc2
+
+
+def adler32(content: bytes, value: int = 1) -> int:
+    """
+    Return the Adler-32 checksum (RFC 1950) of content, continuing from the
+    checksum value of any preceding content.
+
+    Rather than updating both sums per byte, each block adds len(block) * s1
+    plus the sum of the running sums of the block to s2, with the per-byte
+    work done by sum and accumulate.
+    """
+    s1 = value & 0xFFFF
+    s2 = value >> 16
+    content = memoryview(content).cast("B")
+    for start in range(0, len(content), ADLER32_NMAX):
+        block = content[start : start + ADLER32_NMAX]
+        s2 = (s2 + len(block) * s1 + sum(accumulate(block))) % ADLER32_MODULUS
+        s1 = (s1 + sum(block)) % ADLER32_MODULUS
+    return s2 << 16 | s1
+
+
 class BlockType(Enum):
     NO_COMPRESSION = 0b00
     FIXED_HUFFMAN_COMPRESSION = 0b01
@@ -335,14 +566,44 @@ class Distance:
     def from_distance(cls, distance: int):
         if distance in range(1, 5):
             return cls(distance - 1)
-        else:
-            for interval in cls.TABLE:
-                if distance in interval:
-                    code, _ = cls.TABLE[interval]
-                    return cls(code, distance - interval.start)
+        elif distance in range(5, LZ77_MAX_LOOKBACK + 1):
+            code = distance_code(distance)
+            return cls(code, distance - DISTANCE_BASE[code])
         raise ValueError(f"Distance {distance} was not in range [3, 32678]")
 
 
+# Lookup tables for the encode and decode loops, so no Length or Distance
+# objects are built per symbol. Literal/length symbols index LENGTH_BASE and
+# LENGTH_EXTRA_BITS directly (literals have base 0 and no extra bits).
+LENGTH_BASE = [0] * 257 + [Length(code).min_length for code in range(257, 286)]
+LENGTH_EXTRA_BITS = [0] * 257 + [
+    Length(code).extra_bits for code in range(257, 286)
+]
+# the length symbol for each match length, indexed by length
+LENGTH_CODE = [0] * Length.MIN_LENGTH + [
+    Length.from_length(length).code
+    for length in range(Length.MIN_LENGTH, Length.MAX_LENGTH + 1)
+]
+DISTANCE_BASE = [Distance(code).min_distance for code in range(30)]
+DISTANCE_EXTRA_BITS = [Distance(code).extra_bits for code in range(30)]
+# Like zlib's _dist_code: the first 256 entries are the codes of distances
+# 1-256, the next 256 the codes of distances 257-32768 in steps of 128,
+# which never straddle a code boundary.
+DISTANCE_CODE = [
+    bisect_right(DISTANCE_BASE, distance) - 1 for distance in range(1, 257)
+] + [
+    bisect_right(DISTANCE_BASE, distance) - 1
+    for distance in range(1, LZ77_MAX_LOOKBACK + 1, 128)
+]
+
+
+def distance_code(distance: int) -> int:
+    """Return the distance symbol for a distance in [1, 32768]."""
+    if distance <= 256:
+        return DISTANCE_CODE[distance - 1]
+    return DISTANCE_CODE[256 + ((distance - 1) >> 7)]
+
+
 class CodeCode:
     EXTRA_BITS = {16: 2, 17: 3, 18: 7}
     MIN_LENGTH = {16: 3, 17: 3, 18: 11}
@@ -355,18 +616,6 @@ class CodeCode:
         self.min_length = self.MIN_LENGTH[code]
 
 
-class Node:
-    def __init__(self):
-        self.children = defaultdict(Node)
-        self.value = None
-
-    def traverse(self, binary):
-        node = self
-        for char in binary:
-            node = node.children.get(int(char))
-        return node
-
-
 class HuffmanEncoding:
 
     """
@@ -380,10 +629,61 @@ class HuffmanEncoding:
      * Shorter codes lexicographically precede longer codes.
     """
 
+    # Codes up to ROOT_BITS long are resolved with a single lookup, longer
+    # codes go through a second level table linked from the root table.
+    ROOT_BITS = 9
+
     def __init__(self, encoding: list[int], alphabet_code_lengths: list[int]):
         self.encoding = encoding
         self.decode_map = dict([(v, k) for k, v in enumerate(self.encoding)])
         self.alphabet_code_lengths = alphabet_code_lengths
+        # Codes ready to be written least significant bit first, so writing
+        # a symbol is write_code(code_lengths[symbol], reversed_codes[symbol])
+        self.code_lengths = list(alphabet_code_lengths)
+        self.reversed_codes = [
+            int(code[::-1], 2) if length else 0
+            for code, length in zip(encoding, alphabet_code_lengths)
+        ]
+        self._build_table()
+
+    def _build_table(self):
+        """
+        Build a flat decoding table indexed by the next bits of the stream.
+
+        Deflate packs Huffman codes starting with the most significant bit,
+        so the table is indexed by the bit-reversed code. Every entry is a
+        (value, length) pair; entries for bits that don't start a valid code
+        have length 0, and root entries that link to a second level table
+        hold (offset, -bits) instead.
+        """
+        self.max_bits = max(self.alphabet_code_lengths, default=0)
+        self.root_bits = min(self.max_bits, self.ROOT_BITS)
+        self.root_mask = (1 << self.root_bits) - 1
+        self.table = [(None, 0)] * (1 << self.root_bits)
+        long_codes = defaultdict(list)
+        for value, reversed_code in enumerate(self.reversed_codes):
+            length = self.code_lengths[value]
+            if not length:
+                continue
+            if length <= self.root_bits:
+                self.table[reversed_code :: 1 << length] = [
+                    (value, length)
+                ] * (1 << (self.root_bits - length))
+            else:
+                long_codes[reversed_code & self.root_mask].append(
+                    (reversed_code >> self.root_bits, length, value)
+                )
+        for root, codes in long_codes.items():
+            sub_bits = max(length for _, length, _ in codes) - self.root_bits
+            offset = len(self.table)
+            sub_table = [(None, 0)] * (1 << sub_bits)
+            for reversed_code, length, value in codes:
+                step = length - self.root_bits
+                sub_table[reversed_code :: 1 << step] = [(value, length)] * (
+                    1 << (sub_bits - step)
+                )
+            self.table[root] = (offset, -sub_bits)
+            self.table += sub_table
 
     @classmethod
     def from_alphabet_code_lengths(cls, alphabet_code_lengths: list[int]):
@@ -412,7 +712,20 @@ class HuffmanEncoding:
         code = 0
         if 0 in counts_by_length:
             del counts_by_length[0]
-        for bits in range(1, max(counts_by_length) + 1):
+        max_bits = max(counts_by_length, default=0)
+        # the codes of each length that are still unused (the Kraft sum)
+        unused = 1
+        for bits in range(1, max_bits + 1):
+            unused = (unused << 1) - counts_by_length[bits]
+            if unused < 0:
+                raise ValueError(
+                    "invalid Huffman code lengths: over-subscribed"
+                )
+        # like zlib, allow no codes at all, or a single one bit code (e.g.
+        # the distance code of a block with one distance)
+        if unused and max_bits > 1:
+            raise ValueError("invalid Huffman code lengths: incomplete")
+        for bits in range(1, max_bits + 1):
             code = (code + counts_by_length[bits - 1]) << 1
             next_code[bits] = code
         # Assign numerical values to all codes, using consecutive
@@ -420,25 +733,16 @@ class HuffmanEncoding:
         # values determined at step 2. Codes that are never used
         # (which have a bit length of zero) must not be assigned a
         # value.
-        root = node = Node()
         alphabet_encode_map = [0] * len(alphabet_code_lengths)
         for letter_num in range(len(alphabet_code_lengths)):
             code_length = alphabet_code_lengths[letter_num]
             if code_length == 0:
                 continue
-            alphabet_encode_map[letter_num] = next_code[code_length]
-            binary = format(
-                alphabet_encode_map[letter_num], f"0{code_length}b"
+            alphabet_encode_map[letter_num] = format(
+                next_code[code_length], f"0{code_length}b"
             )
-            node = root
-            for char in binary:
-                node = node.children[int(char)]
-            node.value = letter_num
-            alphabet_encode_map[letter_num] = binary
             next_code[code_length] += 1
-        base = cls(alphabet_encode_map, alphabet_code_lengths)
-        base.node = root
-        return base
+        return cls(alphabet_encode_map, alphabet_code_lengths)
 
 
 STATIC_LEN_CODES = HuffmanEncoding.from_alphabet_code_lengths(
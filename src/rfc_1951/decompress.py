@@ -1,11 +1,21 @@
+import sys
 from binascii import crc32
+from dataclasses import dataclass, replace
 from datetime import datetime
-from io import BufferedWriter, BytesIO
+from functools import lru_cache
+from io import SEEK_END, BufferedIOBase, BufferedWriter, BytesIO
 from struct import unpack
+from typing import Iterator, Union
 
 from rfc_1951.core import *
 
 MAX_BIT_OFFSET = 7
+CHUNK_SIZE = 2 ** 16
+MAX_CODE_BITS = 15
+# the most input a length and distance pair can take, with extra bits
+MAX_SYMBOL_BITS = 2 * MAX_CODE_BITS + 5 + 13
+# dynamic Huffman codes kept around for blocks that repeat a header
+HUFFMAN_CACHE_SIZE = 64
 
 
 def get_block_header(stream: BitStream) -> BlockHeader:
@@ -29,19 +39,164 @@ def get_code_codes(
         if code_code in range(0, 16):
             code_codes.append(code_code)
         else:
+            if code_code == 16 and not code_codes:
+                raise ValueError("Code length 16 repeats no previous length")
             to_repeat = code_codes[-1] if code_code == 16 else 0
             code_code = CodeCode(code_code)
             to_add = code_code.min_length + stream.read(
                 code_code.extra_bits, prefer_bytes=False
             )
+            if len(code_codes) + to_add > n:
+                raise ValueError(f"Code length repeat goes past {n} lengths")
             code_codes += [to_repeat] * to_add
     return code_codes
 
 
-def decode(stream: BitStream) -> bytes:
-    output = b""
-    while True:
+class DecompressionLimitError(ValueError):
+    """The output of a stream went over one of its DecompressionLimits."""
+
+
+@dataclass(frozen=True)
+class DecompressionLimits:
+    """
+    Bounds on the output of an untrusted stream, so that a small
+    decompression bomb is stopped early instead of filling memory. They are
+    checked every time output is handed out (at most every chunk_size bytes)
+    and at the start of each block, so the hot decoding loop is unchanged.
+    """
+
+    # the most bytes of output
+    max_output_bytes: int | None = None
+    # the most bytes of output per byte of input read so far
+    max_ratio: float | None = None
+    # the most deflate blocks
+    max_blocks: int | None = None
+
+    def check(self, output_size: int, input_size: int, blocks: int):
+        if (
+            self.max_output_bytes is not None
+            and output_size > self.max_output_bytes
+        ):
+            raise DecompressionLimitError(
+                f"output is over the limit of {self.max_output_bytes} bytes"
+            )
+        if (
+            self.max_ratio is not None
+            and output_size > self.max_ratio * max(1, input_size)
+        ):
+            raise DecompressionLimitError(
+                f"output is over {self.max_ratio} times the input"
+            )
+        if self.max_blocks is not None and blocks > self.max_blocks:
+            raise DecompressionLimitError(
+                f"stream has over {self.max_blocks} blocks"
+            )
+
+    def remaining(
+        self, output_size: int, blocks: int
+    ) -> "DecompressionLimits":
+        """Return the limits left after output_size bytes and blocks."""
+        return replace(
+            self,
+            max_output_bytes=None
+            if self.max_output_bytes is None
+            else self.max_output_bytes - output_size,
+            max_blocks=None
+            if self.max_blocks is None
+            else self.max_blocks - blocks,
+        )
+
+
+def copy_back_reference(window: bytearray, dist: int, length: int):
+    """
+    Append length bytes to window starting dist bytes before its end.
+    When the copy overlaps itself the dist bytes repeat, so the pattern is
+    doubled until it covers length instead of copying byte by byte.
+    """
+    start = len(window) - dist
+    if dist >= length:
+        window += window[start : start + length]
+        return
+    pattern = window[start:]
+    while len(pattern) < length:
+        pattern = pattern + pattern
+    window += pattern[:length]
+
+
+class Inflater:
+    """
+    Decode a deflate stream in chunks, keeping only the last
+    LZ77_MAX_LOOKBACK bytes of output around for back references.
+    """
+
+    def __init__(
+        self,
+        stream: BitStream,
+        chunk_size: int = CHUNK_SIZE,
+        window: bytes = b"",
+        limits: DecompressionLimits | None = None,
+    ):
+        """
+        :param window: output preceding the stream that back references
+            may reach into, e.g. when starting in the middle of a stream
+        :param limits: raise DecompressionLimitError once the output goes
+            over these
+        """
+        self.stream = stream
+        self.limits = limits
+        if limits and limits.max_output_bytes is not None:
+            # hand out (and so check) the output as soon as it's too long
+            chunk_size = max(1, min(chunk_size, limits.max_output_bytes + 1))
+        self.chunk_size = chunk_size
+        # bytes of output handed out, input read by earlier streams (see
+        # Decompressor) and blocks started, for checking the limits
+        self.output_size = 0
+        self.input_size = 0
+        self.stream_start = stream.tell()
+        self.blocks = 0
+        # history followed by output that hasn't been handed out yet
+        self.window = bytearray(window[-LZ77_MAX_LOOKBACK:])
+        self.pending = len(self.window)
+        self.is_final = False
+        # the block being decoded, so that decoding can stop part way
+        # through a block and pick up again later
+        self.in_block = False
+        self.block_is_final = False
+        self.codes: tuple[HuffmanEncoding, HuffmanEncoding] | None = None
+        self.stored_remaining = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        while not self.is_final:
+            yield from self.inflate_block()
+        if self.pending < len(self.window):
+            yield self.take_output()
+
+    def take_output(self) -> bytes:
+        """Return the output decoded so far and slide the window forward."""
+        self.output_size += len(self.window) - self.pending
+        if self.limits:
+            self.check_limits()
+        out = bytes(self.window[self.pending :])
+        del self.window[:-LZ77_MAX_LOOKBACK]
+        self.pending = len(self.window)
+        return out
+
+    def inflate_block(self) -> Iterator[bytes]:
+        """Decode the next block, yielding output every chunk_size bytes."""
+        self.start_block()
+        if self.codes is None:
+            self.inflate_stored(self.stored_remaining)
+        else:
+            yield from self.inflate_codes()
+        if len(self.window) - self.pending >= self.chunk_size:
+            yield self.take_output()
+
+    def start_block(self):
+        """Read the header of the next block, and its codes if it has any."""
+        stream = self.stream
         block_header = get_block_header(stream)
+        codes = None
+        block_len = 0
         if block_header.block_type == BlockType.NO_COMPRESSION:
             stream.clear_buffer()
             block_len, ones_complement = unpack("<HH", stream.read(32))
@@ -49,73 +204,298 @@ def decode(stream: BitStream) -> bytes:
                 raise ValueError(
                     f"Invalid LEN, NLEN pair: {ones_complement} is not the ones-complement of {block_len}"
                 )
-            output += stream.read(block_len * 8)
-        elif (
-            block_header.block_type == BlockType.FIXED_HUFFMAN_COMPRESSION
-            or block_header.block_type == BlockType.DYNAMIC_HUFFMAN_COMPRESSION
-        ):
-            if (
-                block_header.block_type
-                == BlockType.DYNAMIC_HUFFMAN_COMPRESSION
-            ):
-                # read code trees
-                n_len = stream.read(5) + 257
-                n_dist = stream.read(5) + 1
-                n_code = stream.read(4) + 4
-                lengths = [0] * len(CODE_CODE_ORDER)
-                code_codes_added = 0
-                while code_codes_added < n_code:
-                    lengths[CODE_CODE_ORDER[code_codes_added]] = stream.read(3)
-                    code_codes_added += 1
-                code_huffman = HuffmanEncoding.from_alphabet_code_lengths(
-                    lengths
-                )
+        elif block_header.block_type == BlockType.DYNAMIC_HUFFMAN_COMPRESSION:
+            codes = get_dynamic_codes(stream)
+        elif block_header.block_type == BlockType.FIXED_HUFFMAN_COMPRESSION:
+            codes = (STATIC_LEN_CODES, STATIC_DIST_CODES)
+        else:
+            raise ValueError(
+                f"Encountered invalid block {block_header.block_type}"
+            )
+        self.blocks += 1
+        if self.limits:
+            self.check_limits()
+        self.in_block = True
+        self.block_is_final = block_header.is_final
+        self.codes = codes
+        self.stored_remaining = block_len
 
-                code_codes = get_code_codes(
-                    n_len + n_dist, code_huffman, stream
-                )
-                code_code_lengths = code_codes[:n_len]
-                code_code_dists = code_codes[n_len:]
-                len_codes = HuffmanEncoding.from_alphabet_code_lengths(
-                    code_code_lengths
-                )
-                dist_codes = HuffmanEncoding.from_alphabet_code_lengths(
-                    code_code_dists
-                )
+    def check_limits(self):
+        self.limits.check(
+            self.output_size,
+            self.input_size + (self.stream.tell() - self.stream_start) // 8,
+            self.blocks,
+        )
+
+    def end_block(self):
+        self.in_block = False
+        self.codes = None
+        self.is_final = self.block_is_final
+
+    def inflate_stored(self, n: int):
+        """Copy the next n bytes of the current stored block."""
+        self.window += self.stream.read_view(n)
+        self.stored_remaining -= n
+        if not self.stored_remaining:
+            self.end_block()
+
+    def inflate_codes(self, max_symbols: int = sys.maxsize) -> Iterator[bytes]:
+        """
+        Decode up to max_symbols symbols of the current Huffman block,
+        stopping early at the end of the block.
+        """
+        stream = self.stream
+        window = self.window
+        len_codes, dist_codes = self.codes
+        for _ in range(max_symbols):
+            if len(window) - self.pending >= self.chunk_size:
+                yield self.take_output()
+            value = stream.read_huffman_bits(len_codes)
+            if value < 256:
+                window.append(value)
+            elif value == CODE_END_OF_BLOCK:
+                self.end_block()
+                return
             else:
-                len_codes = STATIC_LEN_CODES
-                dist_codes = STATIC_DIST_CODES
-            while True:
-                value = stream.read_huffman_bits(len_codes)
-                if value < 256:
-                    output += chr(value).encode()
-                elif value == CODE_END_OF_BLOCK:
-                    break
-                else:
-                    # decode distance from input stream
-                    # move backwards in output stream
-                    # copy length bytes from this position to output stream
-                    length = Length(value)
-                    length = length.min_length + stream.read(
-                        length.extra_bits, prefer_bytes=False
+                # decode distance from input stream
+                # move backwards in output stream
+                # copy length bytes from this position to output stream
+                if value > 285:
+                    raise ValueError(
+                        "Length must have code where 257 <= code <= 285"
+                    )
+                length = LENGTH_BASE[value]
+                if LENGTH_EXTRA_BITS[value]:
+                    length += stream.read(
+                        LENGTH_EXTRA_BITS[value], prefer_bytes=False
                     )
-                    dist = stream.read_huffman_bits(dist_codes)
-                    dist = Distance(dist)
-                    dist = dist.min_distance + stream.read(
-                        dist.extra_bits, prefer_bytes=False
+                code = stream.read_huffman_bits(dist_codes)
+                if code > 29:
+                    raise ValueError(
+                        "Distance must have code where 0 <= code <= 29"
                     )
-                    index = len(output) - dist
-                    while length:
-                        output += output[index : index + 1]
-                        length -= 1
-                        index += 1
+                dist = DISTANCE_BASE[code]
+                if DISTANCE_EXTRA_BITS[code]:
+                    dist += stream.read(
+                        DISTANCE_EXTRA_BITS[code], prefer_bytes=False
+                    )
+                if dist > len(window):
+                    raise ValueError(
+                        f"Invalid distance {dist} reaches before the start of the output"
+                    )
+                copy_back_reference(window, dist, length)
 
-        else:
-            raise ValueError(
-                f"Encountered invalid block {block_header.block_type}"
+
+class Decompressor:
+    """
+    Decompress a raw deflate stream a piece at a time, like zlib's
+    decompressobj. Input that can't be decoded yet, such as half of a
+    symbol or of a block header, is kept until the next call.
+    """
+
+    def __init__(
+        self,
+        dictionary: bytes = b"",
+        limits: DecompressionLimits | None = None,
+    ):
+        """
+        :param dictionary: the preset dictionary the stream was compressed with
+        :param limits: raise DecompressionLimitError once the output goes
+            over these
+        """
+        self.inflater = Inflater(
+            BitStream(b""), window=dictionary, limits=limits
+        )
+        # input from the read position on isn't fully decoded yet, except
+        # for the first bit_offset bits. Input before the read position is
+        # only dropped once it is most of the buffer, so reading a piece at
+        # a time with max_length doesn't copy the rest of the input
+        self.unconsumed = BytesIO()
+        self.bit_offset = 0
+        # output beyond the max_length of the last call
+        self.output_tail = b""
+        self.eof = False
+        # input after the end of the deflate stream
+        self.unused_data = b""
+
+    def decompress(self, content_in: bytes, max_length: int = 0) -> bytes:
+        """
+        Add content_in, returning as much output as can be decoded so far.
+        :param max_length: if not 0, the most bytes to return. Decoding
+            stops at about that much output and the rest of the input is
+            kept, so call again (e.g. with b"") to continue.
+        """
+        if self.eof:
+            self.unused_data += content_in
+            output, self.output_tail = self._split_output(
+                self.output_tail, max_length
             )
-        if block_header.is_final:
             return output
+        unconsumed = self.unconsumed
+        start = unconsumed.tell()
+        unconsumed.seek(0, SEEK_END)
+        unconsumed.write(content_in)
+        input_bits = 8 * (unconsumed.tell() - start)
+        unconsumed.seek(start)
+        inflater = self.inflater
+        stream = BitStream(unconsumed)
+        if self.bit_offset:
+            stream.read(self.bit_offset, prefer_bytes=False)
+        inflater.stream = stream
+        inflater.stream_start = 0
+        chunks = [self.output_tail]
+        output_len = len(self.output_tail)
+        consumed = stream.tell()
+        while not self.eof:
+            window_output_len = len(inflater.window) - inflater.pending
+            if max_length and output_len + window_output_len >= max_length:
+                break
+            available = input_bits - consumed
+            try:
+                if not inflater.in_block:
+                    inflater.start_block()
+                elif inflater.codes is None:
+                    n = min(inflater.stored_remaining, available // 8)
+                    if inflater.stored_remaining and not n:
+                        break
+                    inflater.inflate_stored(n)
+                else:
+                    # only the last symbols can run out of input, so
+                    # decode those one at a time
+                    max_symbols = max(1, available // MAX_SYMBOL_BITS)
+                    if max_length:
+                        max_symbols = min(
+                            max_symbols,
+                            max(
+                                1,
+                                (max_length - output_len - window_output_len)
+                                // Length.MAX_LENGTH,
+                            ),
+                        )
+                    for chunk in inflater.inflate_codes(max_symbols):
+                        chunks.append(chunk)
+                        output_len += len(chunk)
+            except EOFError:
+                break
+            except KeyError:
+                # zero bits past the end of the input may not be a valid code
+                if input_bits - stream.tell() >= MAX_CODE_BITS:
+                    raise
+                break
+            consumed = stream.tell()
+            self.eof = inflater.is_final
+        if self.eof:
+            stream.clear_buffer()
+            unconsumed.seek(start + stream.tell() // 8)
+            self.unused_data = unconsumed.read()
+            self.unconsumed = BytesIO()
+        else:
+            unconsumed.seek(start + consumed // 8)
+            inflater.input_size += consumed // 8
+            self.bit_offset = consumed % 8
+            if 8 * unconsumed.tell() > input_bits - consumed:
+                self.unconsumed = BytesIO(unconsumed.read())
+        chunks.append(inflater.take_output())
+        output, self.output_tail = self._split_output(
+            b"".join(chunks), max_length
+        )
+        return output
+
+    @staticmethod
+    def _split_output(output: bytes, max_length: int) -> tuple[bytes, bytes]:
+        if not max_length:
+            return output, b""
+        return output[:max_length], output[max_length:]
+
+
+@lru_cache(maxsize=HUFFMAN_CACHE_SIZE)
+def get_huffman(code_lengths: tuple[int, ...]) -> HuffmanEncoding:
+    """
+    Return the decoding table for the code lengths of a dynamic block.
+    Streams often repeat the same code lengths in many blocks, so tables
+    are shared between blocks instead of being rebuilt for each. The hits
+    and misses are counted by get_huffman.cache_info().
+    """
+    return HuffmanEncoding.from_alphabet_code_lengths(list(code_lengths))
+
+
+def get_dynamic_codes(
+    stream: BitStream,
+) -> tuple[HuffmanEncoding, HuffmanEncoding]:
+    """Read the code trees at the start of a dynamic Huffman block."""
+    n_len = stream.read(5) + 257
+    n_dist = stream.read(5) + 1
+    n_code = stream.read(4) + 4
+    lengths = [0] * len(CODE_CODE_ORDER)
+    code_codes_added = 0
+    while code_codes_added < n_code:
+        lengths[CODE_CODE_ORDER[code_codes_added]] = stream.read(3)
+        code_codes_added += 1
+    code_huffman = get_huffman(tuple(lengths))
+
+    code_codes = get_code_codes(n_len + n_dist, code_huffman, stream)
+    len_codes = get_huffman(tuple(code_codes[:n_len]))
+    dist_codes = get_huffman(tuple(code_codes[n_len:]))
+    return len_codes, dist_codes
+
+
+def decode(
+    stream: BitStream,
+    dictionary: bytes = b"",
+    limits: DecompressionLimits | None = None,
+) -> bytes:
+    """
+    :param dictionary: the preset dictionary the stream was compressed with
+    :param limits: raise DecompressionLimitError once the output goes over
+        these
+    """
+    return b"".join(Inflater(stream, window=dictionary, limits=limits))
+
+
+def decompress_raw(
+    content_in: bytes,
+    dictionary: bytes = b"",
+    limits: DecompressionLimits | None = None,
+) -> bytes:
+    """
+    Decompress a raw deflate stream, with no header or trailer.
+    :param dictionary: the preset dictionary the stream was compressed with
+    :param limits: raise DecompressionLimitError once the output goes over
+        these
+    """
+    return decode(BitStream(content_in), dictionary, limits)
+
+
+def zlib_decompress(
+    content_in: bytes,
+    dictionary: bytes = b"",
+    limits: DecompressionLimits | None = None,
+) -> bytes:
+    """
+    Decompress a zlib stream (RFC 1950).
+    :param dictionary: the preset dictionary, if the stream was compressed
+        with one
+    :param limits: raise DecompressionLimitError once the output goes over
+        these
+    """
+    stream = BitStream(content_in)
+    method, flags = stream.read(16)
+    if method & 0x0F != COMPRESSION_METHOD[0] or method >> 4 > 7:
+        raise IOError("given data is not a zlib stream")
+    if (method << 8 | flags) % 31:
+        raise IOError("zlib header check failed")
+    if flags & ZLIB_FDICT:
+        dictionary_id = unpack(">I", stream.read(32))[0]
+        if dictionary_id != adler32(dictionary):
+            raise IOError("zlib stream needs a different preset dictionary")
+    else:
+        dictionary = b""
+    content_out = decode(stream, dictionary, limits)
+    stream.clear_buffer()
+    expected_adler32 = unpack(">I", stream.read(32))[0]
+    if expected_adler32 != adler32(content_out):
+        raise IOError("Adler-32 of uncompressed did not match for zlib stream")
+    return content_out
 
 
 def get_null_terminated_string(stream: BitStream):
@@ -171,17 +551,117 @@ def get_file_header(stream: BitStream):
     return FileHeader(os, mtime, extra_data, filename, comment, crc)
 
 
-def gunzip(stream: BitStream) -> bytes:
-    """
-    :param stream: a stream of a gzip file
-    """
-    get_file_header(stream)
-    output = decode(stream)
+@dataclass
+class GzipMember:
+    """One gzip member, of possibly many concatenated in a file."""
+
+    header: FileHeader
+    # byte offsets of the member within the gzip file
+    start: int
+    end: int | None = None
+    # offset of the member's output within the output of the whole file
+    uncompressed_offset: int = 0
+    size: int = 0
+    blocks: int = 0
+
+
+def gunzip_member(
+    stream: BitStream,
+    member: GzipMember,
+    limits: DecompressionLimits | None = None,
+) -> Iterator[bytes]:
+    """Decompress the deflate stream and check the trailer of a member."""
+    crc = 0
+    inflater = Inflater(stream, limits=limits)
+    for chunk in inflater:
+        crc = crc32(chunk, crc)
+        member.size += len(chunk)
+        yield chunk
+    member.blocks = inflater.blocks
     stream.clear_buffer()
-    crc = unpack("<I", stream.read(32))[0]
-    if crc and crc != crc32(output):
+    expected_crc = unpack("<I", stream.read(32))[0]
+    if expected_crc and expected_crc != crc:
         raise IOError("CRC of uncompressed did not match for gzip file")
     original_size = unpack("<I", stream.read(32))[0]
-    if original_size != len(output) % (2 ** 32):
+    if original_size != member.size % (2 ** 32):
         raise IOError("uncompressed data size did not match for gzip file")
-    return output
+    member.end = stream.tell() // 8
+
+
+def gunzip_members(
+    stream: Union[BitStream, BufferedIOBase],
+    limits: DecompressionLimits | None = None,
+) -> Iterator[tuple[GzipMember, Iterator[bytes]]]:
+    """
+    Decompress every member of a gzip file in turn, yielding each member
+    with an iterator over its output. Any output a caller doesn't read is
+    decompressed and dropped before moving on to the next member. The
+    member's end and size are filled in once its output is exhausted.
+
+    Since members are independent, the (start, end) offsets can be used to
+    hand members to separate processes to decompress with gunzip.
+    :param stream: a stream of a gzip file, positioned at its start
+    :param limits: raise DecompressionLimitError once the output goes over
+        these. The output and block limits are for the whole file, the
+        ratio for each member.
+    """
+    if not isinstance(stream, BitStream):
+        stream = BitStream(stream)
+    uncompressed_offset = 0
+    blocks = 0
+    while True:
+        start = stream.tell() // 8
+        member = GzipMember(
+            get_file_header(stream),
+            start,
+            uncompressed_offset=uncompressed_offset,
+        )
+        chunks = gunzip_member(
+            stream,
+            member,
+            limits and limits.remaining(uncompressed_offset, blocks),
+        )
+        yield member, chunks
+        for _ in chunks:
+            pass
+        uncompressed_offset += member.size
+        blocks += member.blocks
+        if stream.at_end():
+            return
+
+
+def scan_members(stream: Union[BitStream, BufferedIOBase]) -> list[GzipMember]:
+    """Return the header, offsets and size of each member of a gzip file."""
+    members = []
+    for member, chunks in gunzip_members(stream):
+        for _ in chunks:
+            pass
+        members.append(member)
+    return members
+
+
+def gunzip_stream(
+    stream: Union[BitStream, BufferedIOBase],
+    limits: DecompressionLimits | None = None,
+) -> Iterator[bytes]:
+    """
+    Decompress a gzip file in chunks, so the whole output never has to be
+    held in memory. The output of concatenated members is joined, as with
+    the gzip tool.
+    :param stream: a stream of a gzip file
+    :param limits: raise DecompressionLimitError once the output goes over
+        these
+    """
+    for _, chunks in gunzip_members(stream, limits):
+        yield from chunks
+
+
+def gunzip(
+    stream: BitStream, limits: DecompressionLimits | None = None
+) -> bytes:
+    """
+    :param stream: a stream of a gzip file
+    :param limits: raise DecompressionLimitError once the output goes over
+        these, e.g. for untrusted input
+    """
+    return b"".join(gunzip_stream(stream, limits))
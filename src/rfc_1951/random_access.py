@@ -0,0 +1,193 @@
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from io import SEEK_CUR, SEEK_END, SEEK_SET, BufferedIOBase
+from struct import calcsize, pack, unpack
+from typing import Iterator
+
+from rfc_1951.core import *
+from rfc_1951.decompress import Inflater, get_file_header
+
+DEFAULT_SPAN = 2 ** 20
+INDEX_MAGIC = b"GZIX"
+INDEX_HEADER = "<4sQQI"
+ACCESS_POINT_HEADER = "<QQI"
+
+
+@dataclass
+class AccessPoint:
+    """A block boundary that decoding can restart from."""
+
+    # bits from the start of the gzip file to the start of the block
+    bit_offset: int
+    # bytes of output before the block
+    uncompressed_offset: int
+    # the last LZ77_MAX_LOOKBACK bytes of output before the block
+    window: bytes
+
+
+@dataclass
+class GzipIndex:
+    """
+    Access points into a gzip file, in the spirit of zlib's zran.c. Building
+    an index decodes the file once; afterwards reading from any offset only
+    decodes from the closest access point before it.
+    """
+
+    length: int
+    span: int
+    points: list[AccessPoint] = field(default_factory=list)
+
+    @classmethod
+    def build(
+        cls, stream: BufferedIOBase, span: int = DEFAULT_SPAN
+    ) -> "GzipIndex":
+        """
+        Decode the gzip file at the start of stream, adding an access point
+        at the first block boundary after every span bytes of output. Points
+        are only as close as the blocks of the encoder allow: zlib and
+        rfc_1951.compress end a block at least every 16K symbols, but a
+        file written as one huge block has only the first point.
+        """
+        bit_stream = BitStream(stream)
+        get_file_header(bit_stream)
+        inflater = Inflater(bit_stream)
+        index = cls(0, span, [AccessPoint(bit_stream.tell(), 0, b"")])
+        while not inflater.is_final:
+            for chunk in inflater.inflate_block():
+                index.length += len(chunk)
+            offset = index.length + len(inflater.window) - inflater.pending
+            if (
+                not inflater.is_final
+                and offset - index.points[-1].uncompressed_offset >= span
+            ):
+                index.points.append(
+                    AccessPoint(
+                        bit_stream.tell(),
+                        offset,
+                        bytes(inflater.window[-LZ77_MAX_LOOKBACK:]),
+                    )
+                )
+        index.length += len(inflater.take_output())
+        return index
+
+    def find(self, offset: int) -> AccessPoint:
+        """Return the last access point at or before offset."""
+        offsets = [point.uncompressed_offset for point in self.points]
+        return self.points[max(0, bisect_right(offsets, offset) - 1)]
+
+    def to_bytes(self) -> bytes:
+        out = pack(
+            INDEX_HEADER, INDEX_MAGIC, self.length, self.span, len(self.points)
+        )
+        for point in self.points:
+            out += pack(
+                ACCESS_POINT_HEADER,
+                point.bit_offset,
+                point.uncompressed_offset,
+                len(point.window),
+            )
+            out += point.window
+        return out
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "GzipIndex":
+        magic, length, span, num_points = unpack(
+            INDEX_HEADER, raw[: calcsize(INDEX_HEADER)]
+        )
+        if magic != INDEX_MAGIC:
+            raise IOError("given data is not a gzip index")
+        index = cls(length, span)
+        position = calcsize(INDEX_HEADER)
+        for _ in range(num_points):
+            bit_offset, uncompressed_offset, window_len = unpack(
+                ACCESS_POINT_HEADER,
+                raw[position : position + calcsize(ACCESS_POINT_HEADER)],
+            )
+            position += calcsize(ACCESS_POINT_HEADER)
+            window = raw[position : position + window_len]
+            position += window_len
+            index.points.append(
+                AccessPoint(bit_offset, uncompressed_offset, window)
+            )
+        return index
+
+    def save(self, path: str):
+        """Write the index to a sidecar file, e.g. "archive.gz.gzix"."""
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "GzipIndex":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class GzipRandomReader:
+    """
+    Read the output of a gzip file from any offset using a GzipIndex.
+    """
+
+    def __init__(self, stream: BufferedIOBase, index: GzipIndex | None = None):
+        """
+        :param stream: a seekable stream of a gzip file
+        :param index: an index of stream, built if not given
+        """
+        self.stream = stream
+        if index is None:
+            stream.seek(0)
+            index = GzipIndex.build(stream)
+        self.index = index
+        self.offset = 0
+        # output from the current decoder, starting at decoded_offset
+        self.chunks: Iterator[bytes] | None = None
+        self.decoded = b""
+        self.decoded_offset = 0
+
+    def tell(self) -> int:
+        return self.offset
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_CUR:
+            offset += self.offset
+        elif whence == SEEK_END:
+            offset += self.index.length
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self.offset = offset
+        return self.offset
+
+    def _decode_from(self, point: AccessPoint):
+        self.stream.seek(point.bit_offset // 8)
+        bit_stream = BitStream(self.stream)
+        bit_stream.read(point.bit_offset % 8, prefer_bytes=False)
+        self.chunks = iter(Inflater(bit_stream, window=point.window))
+        self.decoded = b""
+        self.decoded_offset = point.uncompressed_offset
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.index.length - self.offset
+        end = min(self.offset + size, self.index.length)
+        if self.offset >= end:
+            return b""
+        point = self.index.find(self.offset)
+        decoded_end = self.decoded_offset + len(self.decoded)
+        # keep decoding forward unless going back or an access point is closer
+        if (
+            self.chunks is None
+            or self.offset < self.decoded_offset
+            or point.uncompressed_offset > decoded_end
+        ):
+            self._decode_from(point)
+        out = []
+        while self.offset < end:
+            if self.offset >= self.decoded_offset + len(self.decoded):
+                self.decoded_offset += len(self.decoded)
+                self.decoded = next(self.chunks, None)
+                if self.decoded is None:
+                    raise IOError("gzip file is shorter than its index")
+                continue
+            start = self.offset - self.decoded_offset
+            out.append(self.decoded[start : start + end - self.offset])
+            self.offset += len(out[-1])
+        return b"".join(out)
@@ -0,0 +1,160 @@
+from functools import lru_cache
+from typing import Type
+
+from rfc_4634.sha import Sha, Sha224, Sha256, Sha384, Sha512
+
+IPAD = 0x36
+OPAD = 0x5C
+# signing keys whose pad states are kept by hmac and hmac_sha*
+PAD_STATE_CACHE_SIZE = 128
+
+
+def get_pad_states(key: bytes, sha: Type[Sha]) -> tuple[Sha, Sha]:
+    """
+    Return the hash states after the key XOR ipad and key XOR opad blocks,
+    which every HMAC with this key starts from.
+    """
+    if len(key) > sha.BLOCK_BYTE_LEN:
+        key = sha.digest(key)
+    key = key.ljust(sha.BLOCK_BYTE_LEN, b"\x00")
+    return (
+        sha(bytes(byte ^ IPAD for byte in key)),
+        sha(bytes(byte ^ OPAD for byte in key)),
+    )
+
+
+@lru_cache(maxsize=PAD_STATE_CACHE_SIZE)
+def get_cached_pad_states(key: bytes, sha: Type[Sha]) -> tuple[Sha, Sha]:
+    """
+    Like get_pad_states, but shared between calls with the same key. The
+    states are only ever copied, never updated.
+    """
+    return get_pad_states(key, sha)
+
+
+class Hmac:
+    """
+    HMAC (RFC 2104, section 7 of RFC 4634) with the interface of the hmac
+    module. The inner and outer hash states after the key blocks are
+    computed once, so copy() or another message only hashes the message.
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        message: bytes = b"",
+        sha: Type[Sha] = Sha256,
+        pad_states: tuple[Sha, Sha] | None = None,
+    ):
+        """
+        :param pad_states: the states from get_pad_states for key, e.g.
+            from get_cached_pad_states
+        """
+        self.sha = sha
+        self.inner_pad, self.outer_pad = pad_states or get_pad_states(key, sha)
+        self.inner = self.inner_pad.copy()
+        if message:
+            self.inner.update(message)
+
+    @property
+    def name(self) -> str:
+        return f"hmac-{self.inner.name}"
+
+    @property
+    def digest_size(self) -> int:
+        return self.inner.digest_size
+
+    @property
+    def block_size(self) -> int:
+        return self.inner.block_size
+
+    def update(self, message: bytes):
+        self.inner.update(message)
+
+    def copy(self) -> "Hmac":
+        other = type(self).__new__(type(self))
+        other.sha = self.sha
+        other.inner_pad = self.inner_pad
+        other.outer_pad = self.outer_pad
+        other.inner = self.inner.copy()
+        return other
+
+    def digest(self) -> bytes:
+        outer = self.outer_pad.copy()
+        outer.update(self.inner.digest())
+        return outer.digest()
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+def hmac(key: bytes, message: bytes, sha: Type[Sha] = Sha256) -> bytes:
+    """Return the HMAC of message, reusing the pad states of recent keys."""
+    key = bytes(key)
+    return Hmac(key, message, sha, get_cached_pad_states(key, sha)).digest()
+
+
+def hmac_sha224(key: bytes, message: bytes) -> bytes:
+    return hmac(key, message, Sha224)
+
+
+def hmac_sha256(key: bytes, message: bytes) -> bytes:
+    return hmac(key, message, Sha256)
+
+
+def hmac_sha384(key: bytes, message: bytes) -> bytes:
+    return hmac(key, message, Sha384)
+
+
+def hmac_sha512(key: bytes, message: bytes) -> bytes:
+    return hmac(key, message, Sha512)
+
+
+def hkdf_extract(
+    salt: bytes, input_key: bytes, sha: Type[Sha] = Sha256
+) -> bytes:
+    """
+    Return a pseudorandom key from input keying material (RFC 5869).
+    :param salt: if empty, a string of zeros as long as a digest is used
+    """
+    if not salt:
+        salt = bytes(sha().digest_size)
+    return Hmac(salt, input_key, sha).digest()
+
+
+def hkdf_expand(
+    key: bytes, info: bytes = b"", length: int = 32, sha: Type[Sha] = Sha256
+) -> bytes:
+    """
+    Return length bytes of output keying material from a pseudorandom key,
+    e.g. from hkdf_extract (RFC 5869). The pad states of the key are only
+    kept for this call, so keys derived once don't evict signing keys from
+    get_cached_pad_states or outlive the call there.
+    """
+    pad_states = get_pad_states(bytes(key), sha)
+    digest_size = sha().digest_size
+    if length > 255 * digest_size:
+        raise ValueError(
+            f"HKDF output can't be longer than {255 * digest_size} bytes"
+        )
+    output = b""
+    block = b""
+    counter = 1
+    while len(output) < length:
+        block = Hmac(
+            key, block + info + bytes([counter]), sha, pad_states
+        ).digest()
+        output += block
+        counter += 1
+    return output[:length]
+
+
+def hkdf(
+    input_key: bytes,
+    salt: bytes = b"",
+    info: bytes = b"",
+    length: int = 32,
+    sha: Type[Sha] = Sha256,
+) -> bytes:
+    """Extract then expand input keying material (RFC 5869)."""
+    return hkdf_expand(hkdf_extract(salt, input_key, sha), info, length, sha)
@@ -1,10 +1,8 @@
-from fixedint import UInt32 as Int32
-from fixedint import UInt64 as Int64
-
-W_MAP = {
-    32: Int32,
-    64: Int64,
-}
+from collections import defaultdict
+from operator import add
+from struct import unpack
+from types import MethodType
+from typing import Union
 
 
 def shr(x: int, n: int) -> int:
@@ -12,7 +10,7 @@ def shr(x: int, n: int) -> int:
 
 
 def shl(x: int, n: int, w: int) -> int:
-    return W_MAP[w](x) << n
+    return (x << n) & ((1 << w) - 1)
 
 
 def rotr(x: int, n: int, w: int) -> int:
@@ -20,187 +18,516 @@ def rotr(x: int, n: int, w: int) -> int:
 
 
 def rotl(x: int, n: int, w: int) -> int:
-    return shl(x, n, w) | shlr(x, w - n)
+    return shl(x, n, w) | shr(x, w - n)
+
+
+class hybridmethod:
+    """
+    A method that is bound to the class when looked up on the class, like
+    classmethod, and to the instance when looked up on an instance.
+    """
+
+    def __init__(self, class_function, instance_function):
+        self.class_function = class_function
+        self.instance_function = instance_function
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return MethodType(self.class_function, owner)
+        return MethodType(self.instance_function, instance)
 
 
 class Sha:
+    """
+    Words are plain ints kept below 2 ** W by masking, rather than fixed
+    width int objects, so a block doesn't allocate thousands of wrappers.
+
+    Instances hash a message incrementally with the interface of hashlib:
+    update() hashes every whole block of its input straight from the
+    caller's buffer, and only a partial block is kept between calls.
+    """
+
     W: int
     K: list[int]
     INITIAL_VALUE: list[int]
     BLOCK_BYTE_LEN: int
     HASH_ROUNDS: int
+    # the number of words of the final hash value that make up the digest
+    DIGEST_WORDS: int = 8
+    # struct format of the 16 big-endian words of a block
+    BLOCK_FORMAT: str
+    # the rotations of BSIG0 and BSIG1, and the rotations then the shift of
+    # SSIG0 and SSIG1
+    BSIG0: tuple[int, int, int]
+    BSIG1: tuple[int, int, int]
+    SSIG0: tuple[int, int, int]
+    SSIG1: tuple[int, int, int]
+
+    def __init__(self, data: bytes = b""):
+        self.hash_value = self.INITIAL_VALUE
+        # the bytes after the last whole block, and the length of the
+        # message so far
+        self.buffer = bytearray()
+        self.length = 0
+        if data:
+            self.update(data)
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__.lower()
+
+    @property
+    def digest_size(self) -> int:
+        return self.DIGEST_WORDS * self.W // 8
+
+    @property
+    def block_size(self) -> int:
+        return self.BLOCK_BYTE_LEN
+
+    def update(self, data: Union[bytes, bytearray, memoryview]):
+        data = memoryview(data).cast("B")
+        self.length += len(data)
+        block_len = self.BLOCK_BYTE_LEN
+        if self.buffer:
+            to_fill = block_len - len(self.buffer)
+            self.buffer += data[:to_fill]
+            data = data[to_fill:]
+            if len(self.buffer) < block_len:
+                return
+            self.hash_value = self.process_block(self.hash_value, self.buffer)
+            self.buffer.clear()
+        end = len(data) - len(data) % block_len
+        hash_value = self.hash_value
+        for start in range(0, end, block_len):
+            hash_value = self.process_block(
+                hash_value, data[start : start + block_len]
+            )
+        self.hash_value = hash_value
+        self.buffer += data[end:]
+
+    def copy(self) -> "Sha":
+        """Return a copy of the state, to hash messages with one prefix."""
+        other = type(self)()
+        other.hash_value = self.hash_value
+        other.buffer = bytearray(self.buffer)
+        other.length = self.length
+        return other
+
+    def final_hash_value(self) -> list[int]:
+        """Return the hash value of the message so far, keeping the state."""
+        last_blocks = memoryview(
+            bytes(self.buffer) + self.padding(self.length)
+        )
+        hash_value = self.hash_value
+        for start in range(0, len(last_blocks), self.BLOCK_BYTE_LEN):
+            hash_value = self.process_block(
+                hash_value, last_blocks[start : start + self.BLOCK_BYTE_LEN]
+            )
+        return hash_value
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
 
     @classmethod
     def ch(cls, x: int, y: int, z: int) -> int:
-        x = W_MAP[cls.W](x)
-        y = W_MAP[cls.W](y)
-        z = W_MAP[cls.W](z)
-        return (x & y) ^ ((~x) & z)
+        return (x & y) ^ (~x & z)
 
     @classmethod
     def maj(cls, x: int, y: int, z: int) -> int:
-        x = W_MAP[cls.W](x)
-        y = W_MAP[cls.W](y)
-        z = W_MAP[cls.W](z)
         return (x & y) ^ (x & z) ^ (y & z)
 
-    @classmethod
-    def process(cls, message: bytes) -> list[int]:
-        message = cls.pad(message)
-        H = cls.INITIAL_VALUE
-        for block_num in range(len(message) // cls.BLOCK_BYTE_LEN):
-            block = message[
-                block_num
-                * cls.BLOCK_BYTE_LEN : (block_num + 1)
-                * cls.BLOCK_BYTE_LEN
-            ]
-            w = []
-            for word in range(len(block) // (cls.W // 8)):
-                w.append(
-                    int.from_bytes(
-                        block[word * (cls.W // 8) : (word + 1) * (cls.W // 8)],
-                        "big",
-                    )
-                )
-            while len(w) < cls.HASH_ROUNDS:
-                w.append(cls.ssig1(w[-2]) + w[-7] + cls.ssig0(w[-15]) + w[-16])
-            a, b, c, d, e, f, g, h = H
-            for t in range(cls.HASH_ROUNDS):
-                t1 = h + cls.bsig1(e) + cls.ch(e, f, g) + cls.K[t] + w[t]
-                t2 = cls.bsig0(a) + cls.maj(a, b, c)
-                h = g
-                g = f
-                f = e
-                e = d + t1
-                d = c
-                c = b
-                b = a
-                a = t1 + t2
-            for i, working_variable in enumerate([a, b, c, d, e, f, g, h]):
-                H[i] += working_variable
-        return H
-
-
-class Sha224256(Sha):
-    W = 32
-    BLOCK_BYTE_LEN = 64
-    HASH_ROUNDS = 64
-    # SHA-224 and SHA-256 use the same sequence of sixty-four constant
-    #    32-bit words, K0, K1, ..., K63.  These words represent the first
-    #    thirty-two bits of the fractional parts of the cube roots of the
-    #    first sixty-four prime numbers.  In hex, these constant words are as
-    #    follows (from left to right):
-
-    K = [
-        W_MAP[32](i)
-        for i in [
-            0x428A2F98,
-            0x71374491,
-            0xB5C0FBCF,
-            0xE9B5DBA5,
-            0x3956C25B,
-            0x59F111F1,
-            0x923F82A4,
-            0xAB1C5ED5,
-            0xD807AA98,
-            0x12835B01,
-            0x243185BE,
-            0x550C7DC3,
-            0x72BE5D74,
-            0x80DEB1FE,
-            0x9BDC06A7,
-            0xC19BF174,
-            0xE49B69C1,
-            0xEFBE4786,
-            0x0FC19DC6,
-            0x240CA1CC,
-            0x2DE92C6F,
-            0x4A7484AA,
-            0x5CB0A9DC,
-            0x76F988DA,
-            0x983E5152,
-            0xA831C66D,
-            0xB00327C8,
-            0xBF597FC7,
-            0xC6E00BF3,
-            0xD5A79147,
-            0x06CA6351,
-            0x14292967,
-            0x27B70A85,
-            0x2E1B2138,
-            0x4D2C6DFC,
-            0x53380D13,
-            0x650A7354,
-            0x766A0ABB,
-            0x81C2C92E,
-            0x92722C85,
-            0xA2BFE8A1,
-            0xA81A664B,
-            0xC24B8B70,
-            0xC76C51A3,
-            0xD192E819,
-            0xD6990624,
-            0xF40E3585,
-            0x106AA070,
-            0x19A4C116,
-            0x1E376C08,
-            0x2748774C,
-            0x34B0BCB5,
-            0x391C0CB3,
-            0x4ED8AA4A,
-            0x5B9CCA4F,
-            0x682E6FF3,
-            0x748F82EE,
-            0x78A5636F,
-            0x84C87814,
-            0x8CC70208,
-            0x90BEFFFA,
-            0xA4506CEB,
-            0xBEF9A3F7,
-            0xC67178F2,
-        ]
-    ]
-
     @classmethod
     def bsig0(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 2, cls.W) ^ rotr(x, 13, cls.W) ^ rotr(x, 22, cls.W)
+        return (
+            rotr(x, cls.BSIG0[0], cls.W)
+            ^ rotr(x, cls.BSIG0[1], cls.W)
+            ^ rotr(x, cls.BSIG0[2], cls.W)
+        )
 
     @classmethod
     def bsig1(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 6, cls.W) ^ rotr(x, 11, cls.W) ^ rotr(x, 25, cls.W)
+        return (
+            rotr(x, cls.BSIG1[0], cls.W)
+            ^ rotr(x, cls.BSIG1[1], cls.W)
+            ^ rotr(x, cls.BSIG1[2], cls.W)
+        )
 
     @classmethod
     def ssig0(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 7, cls.W) ^ rotr(x, 18, cls.W) ^ shr(x, 3)
+        return (
+            rotr(x, cls.SSIG0[0], cls.W)
+            ^ rotr(x, cls.SSIG0[1], cls.W)
+            ^ shr(x, cls.SSIG0[2])
+        )
 
     @classmethod
     def ssig1(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 17, cls.W) ^ rotr(x, 19, cls.W) ^ shr(x, 10)
+        return (
+            rotr(x, cls.SSIG1[0], cls.W)
+            ^ rotr(x, cls.SSIG1[1], cls.W)
+            ^ shr(x, cls.SSIG1[2])
+        )
 
     @classmethod
-    def pad(cls, message: bytes) -> bytes:
-        L = len(message) * 8
-        K = 448 - L
-        if K <= 0:
-            K += 512
+    def padding(cls, length: int) -> bytes:
+        """Return the bytes that pad a message of length bytes."""
+        L = length * 8
+        block_bits = 8 * cls.BLOCK_BYTE_LEN
+        # the bits of padding before the length, which fills the last
+        # 2 * W bits of the block
+        K = (block_bits - 2 * cls.W - L) % block_bits or block_bits
         # Since L is a multiple of 8, we know that the first padded byte will be 1 << 7
         # Similarly, we also must have K divisible by 8
         return (
-            message
-            + int.to_bytes(1 << 7, 1, "big")
+            int.to_bytes(1 << 7, 1, "big")
             + bytes(K // 8 - 1)
-            + int.to_bytes(L, 8, "big")
+            + int.to_bytes(L, cls.W // 4, "big")
+        )
+
+    @classmethod
+    def pad(cls, message: bytes) -> bytes:
+        return message + cls.padding(len(message))
+
+    @classmethod
+    def process_block(cls, H: list[int], block: bytes) -> list[int]:
+        """
+        Return the hash value after one block. This is the computation of
+        section 6.2 with ch, maj and the sigma functions inlined, rotations
+        done as shifts of the word next to a copy of itself, and rounds
+        unrolled 8 at a time so the working variables trade roles instead
+        of being shifted along every round.
+        """
+        width = cls.W
+        mask = (1 << width) - 1
+        b0a, b0b, b0c = cls.BSIG0
+        b1a, b1b, b1c = cls.BSIG1
+        s0a, s0b, s0c = cls.SSIG0
+        s1a, s1b, s1c = cls.SSIG1
+        w = list(unpack(cls.BLOCK_FORMAT, block))
+        for t in range(16, cls.HASH_ROUNDS):
+            x0 = w[t - 15]
+            x1 = w[t - 2]
+            w.append(
+                (
+                    (
+                        (x1 >> s1a | x1 << width - s1a)
+                        ^ (x1 >> s1b | x1 << width - s1b)
+                        ^ x1 >> s1c
+                    )
+                    + w[t - 7]
+                    + (
+                        (x0 >> s0a | x0 << width - s0a)
+                        ^ (x0 >> s0b | x0 << width - s0b)
+                        ^ x0 >> s0c
+                    )
+                    + w[t - 16]
+                )
+                & mask
+            )
+        kw = list(map(add, cls.K, w))
+        a, b, c, d, e, f, g, h = H
+        for t in range(0, cls.HASH_ROUNDS, 8):
+            x = e | e << width
+            t1 = (
+                h
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (g ^ (e & (f ^ g)))
+                + kw[t]
+            )
+            x = a | a << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (a & b) | (c & (a | b))
+            )
+            d = (d + t1) & mask
+            h = (t1 + t2) & mask
+            x = d | d << width
+            t1 = (
+                g
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (f ^ (d & (e ^ f)))
+                + kw[t + 1]
+            )
+            x = h | h << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (h & a) | (b & (h | a))
+            )
+            c = (c + t1) & mask
+            g = (t1 + t2) & mask
+            x = c | c << width
+            t1 = (
+                f
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (e ^ (c & (d ^ e)))
+                + kw[t + 2]
+            )
+            x = g | g << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (g & h) | (a & (g | h))
+            )
+            b = (b + t1) & mask
+            f = (t1 + t2) & mask
+            x = b | b << width
+            t1 = (
+                e
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (d ^ (b & (c ^ d)))
+                + kw[t + 3]
+            )
+            x = f | f << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (f & g) | (h & (f | g))
+            )
+            a = (a + t1) & mask
+            e = (t1 + t2) & mask
+            x = a | a << width
+            t1 = (
+                d
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (c ^ (a & (b ^ c)))
+                + kw[t + 4]
+            )
+            x = e | e << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (e & f) | (g & (e | f))
+            )
+            h = (h + t1) & mask
+            d = (t1 + t2) & mask
+            x = h | h << width
+            t1 = (
+                c
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (b ^ (h & (a ^ b)))
+                + kw[t + 5]
+            )
+            x = d | d << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (d & e) | (f & (d | e))
+            )
+            g = (g + t1) & mask
+            c = (t1 + t2) & mask
+            x = g | g << width
+            t1 = (
+                b
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (a ^ (g & (h ^ a)))
+                + kw[t + 6]
+            )
+            x = c | c << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (c & d) | (e & (c | d))
+            )
+            f = (f + t1) & mask
+            b = (t1 + t2) & mask
+            x = f | f << width
+            t1 = (
+                a
+                + ((x >> b1a ^ x >> b1b ^ x >> b1c) & mask)
+                + (h ^ (f & (g ^ h)))
+                + kw[t + 7]
+            )
+            x = b | b << width
+            t2 = ((x >> b0a ^ x >> b0b ^ x >> b0c) & mask) + (
+                (b & c) | (d & (b | c))
+            )
+            e = (e + t1) & mask
+            a = (t1 + t2) & mask
+        return [(x + y) & mask for x, y in zip(H, (a, b, c, d, e, f, g, h))]
+
+    @classmethod
+    def process(cls, message: bytes) -> list[int]:
+        return cls(message).final_hash_value()
+
+    def _digest(self) -> bytes:
+        return b"".join(
+            [
+                int.to_bytes(intermediate_hash, self.W // 8, "big")
+                for intermediate_hash in self.final_hash_value()[
+                    : self.DIGEST_WORDS
+                ]
+            ]
         )
 
+    def _digest_message(cls, message: bytes) -> bytes:
+        return cls(message).digest()
+
+    @classmethod
+    def digest_many(cls, messages: list[bytes]) -> list[bytes]:
+        """
+        Return the digest of each message. Messages that pad to the same
+        number of blocks are hashed together, with each word of the state a
+        NumPy vector holding that word for every message, so each round is
+        a few vector operations however many messages there are. This
+        needs NumPy, which is an optional dependency.
+        """
+        import numpy as np
+
+        dtype = np.dtype(f"u{cls.W // 8}")
+        K = np.array(cls.K, dtype)
+        by_blocks = defaultdict(list)
+        for i, message in enumerate(messages):
+            blocks = (len(message) + cls.W // 4) // cls.BLOCK_BYTE_LEN + 1
+            by_blocks[blocks].append(i)
+        digests = [b""] * len(messages)
+        for blocks, indices in by_blocks.items():
+            padded = b"".join(cls.pad(messages[i]) for i in indices)
+            # a row of words for each block, with a column for each message
+            words = (
+                np.frombuffer(padded, dtype.newbyteorder(">"))
+                .reshape(len(indices), blocks * 16)
+                .T.astype(dtype)
+            )
+            H = [
+                np.full(len(indices), value, dtype)
+                for value in cls.INITIAL_VALUE
+            ]
+            for block in range(blocks):
+                H = cls._process_block_lanes(
+                    H, words[block * 16 : block * 16 + 16], K
+                )
+            digest_words = np.stack(H[: cls.DIGEST_WORDS], axis=1)
+            out = digest_words.astype(dtype.newbyteorder(">")).tobytes()
+            size = cls.DIGEST_WORDS * cls.W // 8
+            for n, i in enumerate(indices):
+                digests[i] = out[n * size : (n + 1) * size]
+        return digests
+
+    @classmethod
+    def _process_block_lanes(cls, H: list, block, K) -> list:
+        """
+        Like process_block, on NumPy vectors of words with a lane for each
+        message. Unsigned NumPy arithmetic wraps, so nothing is masked.
+        """
+        width = cls.W
+
+        def rotr(x, n):
+            return x >> n | x << (width - n)
+
+        b0a, b0b, b0c = cls.BSIG0
+        b1a, b1b, b1c = cls.BSIG1
+        s0a, s0b, s0c = cls.SSIG0
+        s1a, s1b, s1c = cls.SSIG1
+        w = list(block)
+        for t in range(16, cls.HASH_ROUNDS):
+            x0 = w[t - 15]
+            x1 = w[t - 2]
+            w.append(
+                (rotr(x1, s1a) ^ rotr(x1, s1b) ^ x1 >> s1c)
+                + w[t - 7]
+                + (rotr(x0, s0a) ^ rotr(x0, s0b) ^ x0 >> s0c)
+                + w[t - 16]
+            )
+        a, b, c, d, e, f, g, h = H
+        for t in range(cls.HASH_ROUNDS):
+            t1 = (
+                h
+                + (rotr(e, b1a) ^ rotr(e, b1b) ^ rotr(e, b1c))
+                + (g ^ (e & (f ^ g)))
+                + K[t]
+                + w[t]
+            )
+            t2 = (rotr(a, b0a) ^ rotr(a, b0b) ^ rotr(a, b0c)) + (
+                (a & b) | (c & (a | b))
+            )
+            h, g, f, e, d, c, b, a = g, f, e, d + t1, c, b, a, t1 + t2
+        return [x + y for x, y in zip(H, (a, b, c, d, e, f, g, h))]
+
+    # Sha256.digest(message) hashes a whole message, while
+    # Sha256().digest() returns the digest of everything given to update
+    digest = hybridmethod(_digest_message, _digest)
+
+
+class Sha224256(Sha):
+    W = 32
+    BLOCK_BYTE_LEN = 64
+    HASH_ROUNDS = 64
+    BLOCK_FORMAT = ">16I"
+    BSIG0 = (2, 13, 22)
+    BSIG1 = (6, 11, 25)
+    SSIG0 = (7, 18, 3)
+    SSIG1 = (17, 19, 10)
+    # SHA-224 and SHA-256 use the same sequence of sixty-four constant
+    #    32-bit words, K0, K1, ..., K63.  These words represent the first
+    #    thirty-two bits of the fractional parts of the cube roots of the
+    #    first sixty-four prime numbers.  In hex, these constant words are as
+    #    follows (from left to right):
+
+    K = [
+        0x428A2F98,
+        0x71374491,
+        0xB5C0FBCF,
+        0xE9B5DBA5,
+        0x3956C25B,
+        0x59F111F1,
+        0x923F82A4,
+        0xAB1C5ED5,
+        0xD807AA98,
+        0x12835B01,
+        0x243185BE,
+        0x550C7DC3,
+        0x72BE5D74,
+        0x80DEB1FE,
+        0x9BDC06A7,
+        0xC19BF174,
+        0xE49B69C1,
+        0xEFBE4786,
+        0x0FC19DC6,
+        0x240CA1CC,
+        0x2DE92C6F,
+        0x4A7484AA,
+        0x5CB0A9DC,
+        0x76F988DA,
+        0x983E5152,
+        0xA831C66D,
+        0xB00327C8,
+        0xBF597FC7,
+        0xC6E00BF3,
+        0xD5A79147,
+        0x06CA6351,
+        0x14292967,
+        0x27B70A85,
+        0x2E1B2138,
+        0x4D2C6DFC,
+        0x53380D13,
+        0x650A7354,
+        0x766A0ABB,
+        0x81C2C92E,
+        0x92722C85,
+        0xA2BFE8A1,
+        0xA81A664B,
+        0xC24B8B70,
+        0xC76C51A3,
+        0xD192E819,
+        0xD6990624,
+        0xF40E3585,
+        0x106AA070,
+        0x19A4C116,
+        0x1E376C08,
+        0x2748774C,
+        0x34B0BCB5,
+        0x391C0CB3,
+        0x4ED8AA4A,
+        0x5B9CCA4F,
+        0x682E6FF3,
+        0x748F82EE,
+        0x78A5636F,
+        0x84C87814,
+        0x8CC70208,
+        0x90BEFFFA,
+        0xA4506CEB,
+        0xBEF9A3F7,
+        0xC67178F2,
+    ]
+
 
 class Sha384512(Sha):
     W = 64
     BLOCK_BYTE_LEN = 128
     HASH_ROUNDS = 80
+    BLOCK_FORMAT = ">16Q"
+    BSIG0 = (28, 34, 39)
+    BSIG1 = (14, 18, 41)
+    SSIG0 = (1, 8, 7)
+    SSIG1 = (19, 61, 6)
     # SHA-384 and SHA-512 use the same sequence of eighty constant 64-bit
     # words, K0, K1, ... K79.  These words represent the first sixty-four
     # bits of the fractional parts of the cube roots of the first eighty
@@ -208,222 +535,138 @@ class Sha384512(Sha):
     # left to right):
 
     K = [
-        W_MAP[64](i)
-        for i in [
-            0x428A2F98D728AE22,
-            0x7137449123EF65CD,
-            0xB5C0FBCFEC4D3B2F,
-            0xE9B5DBA58189DBBC,
-            0x3956C25BF348B538,
-            0x59F111F1B605D019,
-            0x923F82A4AF194F9B,
-            0xAB1C5ED5DA6D8118,
-            0xD807AA98A3030242,
-            0x12835B0145706FBE,
-            0x243185BE4EE4B28C,
-            0x550C7DC3D5FFB4E2,
-            0x72BE5D74F27B896F,
-            0x80DEB1FE3B1696B1,
-            0x9BDC06A725C71235,
-            0xC19BF174CF692694,
-            0xE49B69C19EF14AD2,
-            0xEFBE4786384F25E3,
-            0x0FC19DC68B8CD5B5,
-            0x240CA1CC77AC9C65,
-            0x2DE92C6F592B0275,
-            0x4A7484AA6EA6E483,
-            0x5CB0A9DCBD41FBD4,
-            0x76F988DA831153B5,
-            0x983E5152EE66DFAB,
-            0xA831C66D2DB43210,
-            0xB00327C898FB213F,
-            0xBF597FC7BEEF0EE4,
-            0xC6E00BF33DA88FC2,
-            0xD5A79147930AA725,
-            0x06CA6351E003826F,
-            0x142929670A0E6E70,
-            0x27B70A8546D22FFC,
-            0x2E1B21385C26C926,
-            0x4D2C6DFC5AC42AED,
-            0x53380D139D95B3DF,
-            0x650A73548BAF63DE,
-            0x766A0ABB3C77B2A8,
-            0x81C2C92E47EDAEE6,
-            0x92722C851482353B,
-            0xA2BFE8A14CF10364,
-            0xA81A664BBC423001,
-            0xC24B8B70D0F89791,
-            0xC76C51A30654BE30,
-            0xD192E819D6EF5218,
-            0xD69906245565A910,
-            0xF40E35855771202A,
-            0x106AA07032BBD1B8,
-            0x19A4C116B8D2D0C8,
-            0x1E376C085141AB53,
-            0x2748774CDF8EEB99,
-            0x34B0BCB5E19B48A8,
-            0x391C0CB3C5C95A63,
-            0x4ED8AA4AE3418ACB,
-            0x5B9CCA4F7763E373,
-            0x682E6FF3D6B2B8A3,
-            0x748F82EE5DEFB2FC,
-            0x78A5636F43172F60,
-            0x84C87814A1F0AB72,
-            0x8CC702081A6439EC,
-            0x90BEFFFA23631E28,
-            0xA4506CEBDE82BDE9,
-            0xBEF9A3F7B2C67915,
-            0xC67178F2E372532B,
-            0xCA273ECEEA26619C,
-            0xD186B8C721C0C207,
-            0xEADA7DD6CDE0EB1E,
-            0xF57D4F7FEE6ED178,
-            0x06F067AA72176FBA,
-            0x0A637DC5A2C898A6,
-            0x113F9804BEF90DAE,
-            0x1B710B35131C471B,
-            0x28DB77F523047D84,
-            0x32CAAB7B40C72493,
-            0x3C9EBE0A15C9BEBC,
-            0x431D67C49C100D4C,
-            0x4CC5D4BECB3E42B6,
-            0x597F299CFC657E2A,
-            0x5FCB6FAB3AD6FAEC,
-            0x6C44198C4A475817,
-        ]
+        0x428A2F98D728AE22,
+        0x7137449123EF65CD,
+        0xB5C0FBCFEC4D3B2F,
+        0xE9B5DBA58189DBBC,
+        0x3956C25BF348B538,
+        0x59F111F1B605D019,
+        0x923F82A4AF194F9B,
+        0xAB1C5ED5DA6D8118,
+        0xD807AA98A3030242,
+        0x12835B0145706FBE,
+        0x243185BE4EE4B28C,
+        0x550C7DC3D5FFB4E2,
+        0x72BE5D74F27B896F,
+        0x80DEB1FE3B1696B1,
+        0x9BDC06A725C71235,
+        0xC19BF174CF692694,
+        0xE49B69C19EF14AD2,
+        0xEFBE4786384F25E3,
+        0x0FC19DC68B8CD5B5,
+        0x240CA1CC77AC9C65,
+        0x2DE92C6F592B0275,
+        0x4A7484AA6EA6E483,
+        0x5CB0A9DCBD41FBD4,
+        0x76F988DA831153B5,
+        0x983E5152EE66DFAB,
+        0xA831C66D2DB43210,
+        0xB00327C898FB213F,
+        0xBF597FC7BEEF0EE4,
+        0xC6E00BF33DA88FC2,
+        0xD5A79147930AA725,
+        0x06CA6351E003826F,
+        0x142929670A0E6E70,
+        0x27B70A8546D22FFC,
+        0x2E1B21385C26C926,
+        0x4D2C6DFC5AC42AED,
+        0x53380D139D95B3DF,
+        0x650A73548BAF63DE,
+        0x766A0ABB3C77B2A8,
+        0x81C2C92E47EDAEE6,
+        0x92722C851482353B,
+        0xA2BFE8A14CF10364,
+        0xA81A664BBC423001,
+        0xC24B8B70D0F89791,
+        0xC76C51A30654BE30,
+        0xD192E819D6EF5218,
+        0xD69906245565A910,
+        0xF40E35855771202A,
+        0x106AA07032BBD1B8,
+        0x19A4C116B8D2D0C8,
+        0x1E376C085141AB53,
+        0x2748774CDF8EEB99,
+        0x34B0BCB5E19B48A8,
+        0x391C0CB3C5C95A63,
+        0x4ED8AA4AE3418ACB,
+        0x5B9CCA4F7763E373,
+        0x682E6FF3D6B2B8A3,
+        0x748F82EE5DEFB2FC,
+        0x78A5636F43172F60,
+        0x84C87814A1F0AB72,
+        0x8CC702081A6439EC,
+        0x90BEFFFA23631E28,
+        0xA4506CEBDE82BDE9,
+        0xBEF9A3F7B2C67915,
+        0xC67178F2E372532B,
+        0xCA273ECEEA26619C,
+        0xD186B8C721C0C207,
+        0xEADA7DD6CDE0EB1E,
+        0xF57D4F7FEE6ED178,
+        0x06F067AA72176FBA,
+        0x0A637DC5A2C898A6,
+        0x113F9804BEF90DAE,
+        0x1B710B35131C471B,
+        0x28DB77F523047D84,
+        0x32CAAB7B40C72493,
+        0x3C9EBE0A15C9BEBC,
+        0x431D67C49C100D4C,
+        0x4CC5D4BECB3E42B6,
+        0x597F299CFC657E2A,
+        0x5FCB6FAB3AD6FAEC,
+        0x6C44198C4A475817,
     ]
 
-    @classmethod
-    def bsig0(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 28, cls.W) ^ rotr(x, 34, cls.W) ^ rotr(x, 39, cls.W)
-
-    @classmethod
-    def bsig1(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 14, cls.W) ^ rotr(x, 18, cls.W) ^ rotr(x, 41, cls.W)
-
-    @classmethod
-    def ssig0(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 1, cls.W) ^ rotr(x, 8, cls.W) ^ shr(x, 7)
-
-    @classmethod
-    def ssig1(cls, x: int) -> int:
-        x = W_MAP[cls.W](x)
-        return rotr(x, 19, cls.W) ^ rotr(x, 61, cls.W) ^ shr(x, 6)
-
-    @classmethod
-    def pad(cls, message: bytes) -> bytes:
-        L = len(message) * 8
-        K = 896 - L
-        if K <= 0:
-            K += 1024
-        # Since L is a multiple of 8, we know that the first padded byte will be 1 << 7
-        # Similarly, we also must have K divisible by 8
-        return (
-            message
-            + int.to_bytes(1 << 7, 1, "big")
-            + bytes(K // 8 - 1)
-            + int.to_bytes(L, 16, "big")
-        )
-
 
 class Sha224(Sha224256):
+    DIGEST_WORDS = 7
     INITIAL_VALUE = [
-        W_MAP[32](i)
-        for i in [
-            0xC1059ED8,
-            0x367CD507,
-            0x3070DD17,
-            0xF70E5939,
-            0xFFC00B31,
-            0x68581511,
-            0x64F98FA7,
-            0xBEFA4FA4,
-        ]
+        0xC1059ED8,
+        0x367CD507,
+        0x3070DD17,
+        0xF70E5939,
+        0xFFC00B31,
+        0x68581511,
+        0x64F98FA7,
+        0xBEFA4FA4,
     ]
 
-    @classmethod
-    def digest(cls, message: bytes) -> bytes:
-        return b"".join(
-            [
-                int.to_bytes(intermediate_hash, 4, "big")
-                for intermediate_hash in cls.process(message)[:7]
-            ]
-        )
-
 
 class Sha256(Sha224256):
     INITIAL_VALUE = [
-        W_MAP[32](i)
-        for i in [
-            0x6A09E667,
-            0xBB67AE85,
-            0x3C6EF372,
-            0xA54FF53A,
-            0x510E527F,
-            0x9B05688C,
-            0x1F83D9AB,
-            0x5BE0CD19,
-        ]
+        0x6A09E667,
+        0xBB67AE85,
+        0x3C6EF372,
+        0xA54FF53A,
+        0x510E527F,
+        0x9B05688C,
+        0x1F83D9AB,
+        0x5BE0CD19,
     ]
 
-    @classmethod
-    def digest(cls, message: bytes) -> bytes:
-        return b"".join(
-            [
-                int.to_bytes(intermediate_hash, 4, "big")
-                for intermediate_hash in cls.process(message)
-            ]
-        )
-
 
 class Sha384(Sha384512):
+    DIGEST_WORDS = 6
     INITIAL_VALUE = [
-        W_MAP[64](i)
-        for i in [
-            0xCBBB9D5DC1059ED8,
-            0x629A292A367CD507,
-            0x9159015A3070DD17,
-            0x152FECD8F70E5939,
-            0x67332667FFC00B31,
-            0x8EB44A8768581511,
-            0xDB0C2E0D64F98FA7,
-            0x47B5481DBEFA4FA4,
-        ]
+        0xCBBB9D5DC1059ED8,
+        0x629A292A367CD507,
+        0x9159015A3070DD17,
+        0x152FECD8F70E5939,
+        0x67332667FFC00B31,
+        0x8EB44A8768581511,
+        0xDB0C2E0D64F98FA7,
+        0x47B5481DBEFA4FA4,
     ]
 
-    @classmethod
-    def digest(cls, message: bytes) -> bytes:
-        return b"".join(
-            [
-                int.to_bytes(intermediate_hash, 8, "big")
-                for intermediate_hash in cls.process(message)[:6]
-            ]
-        )
-
 
 class Sha512(Sha384512):
     INITIAL_VALUE = [
-        W_MAP[64](i)
-        for i in [
-            0x6A09E667F3BCC908,
-            0xBB67AE8584CAA73B,
-            0x3C6EF372FE94F82B,
-            0xA54FF53A5F1D36F1,
-            0x510E527FADE682D1,
-            0x9B05688C2B3E6C1F,
-            0x1F83D9ABFB41BD6B,
-            0x5BE0CD19137E2179,
-        ]
+        0x6A09E667F3BCC908,
+        0xBB67AE8584CAA73B,
+        0x3C6EF372FE94F82B,
+        0xA54FF53A5F1D36F1,
+        0x510E527FADE682D1,
+        0x9B05688C2B3E6C1F,
+        0x1F83D9ABFB41BD6B,
+        0x5BE0CD19137E2179,
     ]
-
-    @classmethod
-    def digest(cls, message: bytes) -> bytes:
-        return b"".join(
-            [
-                int.to_bytes(intermediate_hash, 8, "big")
-                for intermediate_hash in cls.process(message)
-            ]
-        )
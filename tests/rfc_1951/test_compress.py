@@ -1,6 +1,10 @@
+import zlib
+from math import ceil
+from random import Random
 from io import BufferedReader, BytesIO
 
 import pkg_resources
+import pytest
 
 from rfc_1951.compress import *
 from rfc_1951.core import *
@@ -28,10 +32,58 @@ def test_zip_literal_fixed_compression_long_match():
     assert unzipped == content_in
 
 
-def test_length_distance():
-    assert get_length_distance("abaaba", 3, {"aba": [0]}) == (3, 3)
-    assert get_length_distance("abaabac", 3, {"aba": [0]}) == (3, 3)
-    assert get_length_distance("abaabaa", 3, {"aba": [0]}) == (4, 3)
+@pytest.mark.parametrize(
+    "content_in,expected",
+    [
+        (b"abaaba", (3, 3)),
+        (b"abaabac", (3, 3)),
+        (b"abaabaa", (4, 3)),
+        (b"abcabd", (0, 0)),
+    ],
+)
+def test_longest_match(content_in, expected):
+    finder = MatchFinder(content_in, COMPRESSION_LEVELS[DEFAULT_LEVEL])
+    for position in range(3):
+        finder.insert(position)
+    assert finder.longest_match(3, finder.insert(3)) == expected
+
+
+def test_longest_match_prefers_longest():
+    content_in = b"abcd----abcdef--abcde-abcdef"
+    finder = MatchFinder(content_in, COMPRESSION_LEVELS[9])
+    for position in range(22):
+        finder.insert(position)
+    assert finder.longest_match(22, finder.insert(22)) == (6, 14)
+
+
+def test_lazy_tokens_prefer_longer_next_match():
+    content_in = b"xabcyz" + b"bcdefghi" + b"--" + b"abcdefghi"
+    greedy = get_greedy_tokens(content_in, COMPRESSION_LEVELS[3])
+    lazy = get_lazy_tokens(content_in, COMPRESSION_LEVELS[6])
+    assert greedy[-2:] == [(3, 15), (6, 11)]
+    assert lazy[-2:] == [(ord("a"), 0), (8, 11)]
+
+
+def test_longest_match_window():
+    content_in = b"xyz" + bytes(LZ77_MAX_LOOKBACK) + b"xyz"
+    tokens = get_tokens(content_in)
+    assert tokens[-1] == (ord("z"), 0)
+
+
+@pytest.mark.parametrize("level", range(1, 10))
+def test_zip_levels(level):
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        expected = f.read()
+    zipped = gzip(BytesIO(expected), level=level)
+    assert zlib.decompress(zipped, wbits=31) == expected
+
+
+def test_zip_invalid_level():
+    with pytest.raises(ValueError, match="Invalid compression level"):
+        gzip(BytesIO(b"hello"), level=10)
 
 
 def test_zip_unzip_file():
@@ -43,3 +95,285 @@ def test_zip_unzip_file():
     zipped = gzip(BytesIO(expected))
     unzipped = gunzip(BitStream(BytesIO(zipped)))
     assert unzipped == expected
+
+
+def test_gzip_stream():
+    content_in = pkg_resources.resource_string(__name__, "data/rfc_1951") * 3
+    chunks = list(gzip_stream(BytesIO(content_in), read_size=10000))
+    # the header, output once COMPRESSOR_BUFFER_SIZE bytes were read, the
+    # final block and the trailer
+    assert len(chunks) == 4
+    assert zlib.decompress(b"".join(chunks), wbits=31) == content_in
+
+
+def test_zip_dynamic_compression():
+    content_in = b"hello, world! hello, world! " * 10 + bytes(range(256))
+    zipped = gzip(BytesIO(content_in), BlockType.DYNAMIC_HUFFMAN_COMPRESSION)
+    assert zlib.decompress(zipped, wbits=31) == content_in
+    assert gunzip(BitStream(BytesIO(zipped))) == content_in
+
+
+def test_zip_dynamic_compression_smaller_than_fixed():
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        expected = f.read()
+    fixed = gzip(BytesIO(expected), BlockType.FIXED_HUFFMAN_COMPRESSION)
+    dynamic = gzip(BytesIO(expected), BlockType.DYNAMIC_HUFFMAN_COMPRESSION)
+    assert len(dynamic) < len(fixed)
+    assert gunzip(BitStream(BytesIO(dynamic))) == expected
+
+
+@pytest.mark.parametrize("max_bits", [7, 15])
+def test_get_code_lengths_limited(max_bits):
+    # Fibonacci frequencies produce the deepest possible Huffman tree
+    frequencies = [1, 1]
+    while len(frequencies) < 30:
+        frequencies.append(frequencies[-1] + frequencies[-2])
+    code_lengths = get_code_lengths(frequencies, max_bits)
+    assert max(code_lengths) == max_bits
+    assert sum(2 ** -length for length in code_lengths) == 1
+
+
+def test_get_code_code_runs():
+    code_lengths = [0] * 150 + [8] * 8 + [0] * 5 + [3, 4] + [7] * 3
+    runs = get_code_code_runs(code_lengths)
+    assert [code for code, _ in runs] == [18, 18, 8, 16, 8, 17, 3, 4, 7, 7, 7]
+    decoded = []
+    for code, extra in runs:
+        if code == 16:
+            decoded += [decoded[-1]] * (CodeCode(code).min_length + extra)
+        elif code in (17, 18):
+            decoded += [0] * (CodeCode(code).min_length + extra)
+        else:
+            decoded.append(code)
+    assert decoded == code_lengths
+
+
+def test_zip_no_compression_multiple_blocks():
+    content_in = bytes(range(256)) * 300
+    zipped = gzip(BytesIO(content_in), BlockType.NO_COMPRESSION)
+    assert zlib.decompress(zipped, wbits=31) == content_in
+    assert gunzip(BitStream(BytesIO(zipped))) == content_in
+
+
+def test_zip_adaptive_blocks():
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        text = f.read()
+    content_in = text[:20000] + Random(0).randbytes(20000) + text[20000:]
+    blocks = split_tokens(get_tokens(content_in), content_in)
+    assert len(blocks) > 1
+    assert b"".join(block.content for block in blocks) == content_in
+    zipped = gzip(BytesIO(content_in))
+    fixed = gzip(BytesIO(content_in), BlockType.FIXED_HUFFMAN_COMPRESSION)
+    assert len(zipped) < len(fixed)
+    assert zlib.decompress(zipped, wbits=31) == content_in
+    assert gunzip(BitStream(BytesIO(zipped))) == content_in
+
+
+def test_split_tokens_max_block_tokens():
+    content_in = bytes(range(256)) * 200
+    tokens = [(byte, 0) for byte in content_in]
+    blocks = split_tokens(tokens, content_in)
+    assert len(blocks) == ceil(len(tokens) / MAX_BLOCK_TOKENS)
+    assert all(block.num_tokens <= MAX_BLOCK_TOKENS for block in blocks)
+    assert [token for block in blocks for token in block.tokens] == tokens
+    assert b"".join(block.content for block in blocks) == content_in
+
+
+@pytest.mark.parametrize("block_type", [None, BlockType.NO_COMPRESSION])
+def test_encode_parallel(block_type):
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        expected = f.read()
+    serial = encode(BytesIO(expected), block_type)
+    parallel = encode(
+        BytesIO(expected), block_type, processes=2, chunk_size=10000
+    )
+    assert parallel[-8:] == serial[-8:]
+    assert zlib.decompress(parallel, wbits=-15) == expected
+
+
+def test_get_chunk_dictionary():
+    content_in = bytes(range(256)) * 1024
+    dictionary = b"dictionary" * 5000
+    late = get_chunk_dictionary(content_in, dictionary, 200000)
+    assert len(late) <= LZ77_MAX_LOOKBACK
+    assert late == content_in[200000 - LZ77_MAX_LOOKBACK : 200000]
+    early = get_chunk_dictionary(content_in, dictionary, 1000)
+    assert early == (dictionary + content_in[:1000])[-LZ77_MAX_LOOKBACK:]
+    assert get_chunk_dictionary(content_in, b"", 1000) == content_in[:1000]
+
+
+def test_deflate_dictionary():
+    dictionary = b"hello, world! " * 10
+    deflated = deflate(b"hello, world!", dictionary=dictionary)
+    assert len(deflated) < len(deflate(b"hello, world!"))
+    decompressor = zlib.decompressobj(wbits=-15, zdict=dictionary)
+    assert decompressor.decompress(deflated) == b"hello, world!"
+
+
+def test_dictionary_finder_cached():
+    dictionary = b"hello, world! " * 100
+    get_dictionary_finder.cache_clear()
+    first = compress_raw(b"hello, world!", dictionary=dictionary)
+    second = compress_raw(b"hello, world!", dictionary=dictionary)
+    assert first == second
+    assert get_dictionary_finder.cache_info().hits == 1
+    # records extend copies, never the cached finder
+    assert get_dictionary_finder(dictionary).content_in == dictionary
+    decompressor = zlib.decompressobj(wbits=-15, zdict=dictionary)
+    assert decompressor.decompress(second) == b"hello, world!"
+
+
+def test_build_dictionary():
+    random = Random(0)
+    records = [
+        b'{"id": %d, "event": "%s", "region": "%s"}'
+        % (
+            random.randrange(10 ** 6),
+            random.choice([b"login", b"logout", b"purchase"]),
+            random.choice([b"us-east-1", b"eu-west-2"]),
+        )
+        for _ in range(200)
+    ]
+    dictionary = build_dictionary(records[:100])
+    assert b'"event": "' in dictionary
+    assert len(build_dictionary(records[:100], size=16)) <= 16
+    plain_size = with_dictionary_size = 0
+    for record in records[100:]:
+        plain_size += len(deflate(record))
+        deflated = deflate(record, dictionary=dictionary)
+        with_dictionary_size += len(deflated)
+        assert decode(BitStream(deflated), dictionary) == record
+    assert with_dictionary_size < plain_size / 2
+
+
+def test_encode_dictionary():
+    content_in = b"hello, world! " * 1000
+    dictionary = b"hello, world! "
+    raw = encode(BytesIO(content_in), dictionary=dictionary)
+    assert decode(BitStream(raw[:-8]), dictionary) == content_in
+    raw = encode(
+        BytesIO(content_in),
+        processes=2,
+        chunk_size=1000,
+        dictionary=dictionary,
+    )
+    decompressor = zlib.decompressobj(wbits=-15, zdict=dictionary)
+    assert decompressor.decompress(raw[:-8]) == content_in
+
+
+@pytest.mark.parametrize("level", [1, 5, 6, 9])
+def test_zlib_compress(level):
+    content_in = pkg_resources.resource_string(__name__, "data/rfc_1951")
+    compressed = zlib_compress(content_in, level)
+    assert zlib.decompress(compressed) == content_in
+    assert zlib_decompress(compressed) == content_in
+    assert zlib_decompress(zlib.compress(content_in, level)) == content_in
+
+
+def test_zlib_dictionary():
+    dictionary = b'{"event": "login", "region": "us-east-1"}'
+    content_in = b'{"event": "logout", "region": "us-east-1"}'
+    compressed = zlib_compress(content_in, dictionary=dictionary)
+    decompressor = zlib.decompressobj(zdict=dictionary)
+    assert decompressor.decompress(compressed) == content_in
+    assert zlib_decompress(compressed, dictionary) == content_in
+    with pytest.raises(IOError):
+        zlib_decompress(compressed)
+    compressor = zlib.compressobj(zdict=dictionary)
+    compressed = compressor.compress(content_in) + compressor.flush()
+    assert zlib_decompress(compressed, dictionary) == content_in
+
+
+def test_zlib_decompress_invalid():
+    compressed = zlib.compress(b"hello, world")
+    with pytest.raises(IOError):
+        zlib_decompress(compressed[:-1] + bytes([compressed[-1] ^ 1]))
+    with pytest.raises(IOError):
+        zlib_decompress(bytes([compressed[0] ^ 1]) + compressed[1:])
+
+
+def test_raw_round_trip():
+    content_in = b"hello, world! " * 100
+    compressed = compress_raw(content_in)
+    assert zlib.decompress(compressed, wbits=-15) == content_in
+    assert decompress_raw(compressed) == content_in
+    assert decompress_raw(zlib.compress(content_in)[2:-4]) == content_in
+
+
+def test_compressor():
+    content_in = pkg_resources.resource_string(__name__, "data/rfc_1951")
+    compressor = Compressor()
+    decompressor = zlib.decompressobj(wbits=-15)
+    decompressed = b""
+    for start in range(0, len(content_in), 5000):
+        chunk = content_in[start : start + 5000]
+        compressed = compressor.compress(chunk) + compressor.flush(
+            Z_SYNC_FLUSH
+        )
+        assert compressed.endswith(b"\x00\x00\xff\xff")
+        decompressed += decompressor.decompress(compressed)
+        assert decompressed == content_in[: start + len(chunk)]
+    decompressed += decompressor.decompress(compressor.flush())
+    assert decompressor.eof
+    assert decompressed == content_in
+    with pytest.raises(ValueError):
+        compressor.compress(b"more")
+
+
+def test_match_finder_extend():
+    content_in = pkg_resources.resource_string(__name__, "data/rfc_1951")
+    dictionary, content_in = content_in[:20000], content_in[20000:30000]
+    finder = MatchFinder(b"", COMPRESSION_LEVELS[DEFAULT_LEVEL])
+    finder.extend(dictionary)
+    for position in range(len(dictionary)):
+        finder.insert(position)
+    start = finder.extend(content_in)
+    assert start == len(dictionary)
+    assert find_tokens(finder, start) == get_tokens(
+        content_in, dictionary=dictionary
+    )
+
+
+def test_compressor_slides_window():
+    content_in = pkg_resources.resource_string(__name__, "data/rfc_1951") * 4
+    compressor = Compressor()
+    compressed = b""
+    for start in range(0, len(content_in), 1000):
+        compressed += compressor.compress(content_in[start : start + 1000])
+        compressed += compressor.flush(Z_SYNC_FLUSH)
+        assert len(compressor.finder.content_in) < 2 * LZ77_MAX_LOOKBACK + 1000
+    compressed += compressor.flush()
+    assert zlib.decompress(compressed, wbits=-15) == content_in
+
+
+def test_compressor_buffers_until_flush():
+    content_in = Random(0).randbytes(COMPRESSOR_BUFFER_SIZE)
+    compressor = Compressor(level=1)
+    assert compressor.compress(content_in[:100]) == b""
+    compressed = compressor.compress(content_in[100:])
+    assert compressed
+    compressed += compressor.flush(Z_NO_FLUSH) + compressor.flush()
+    assert zlib.decompress(compressed, wbits=-15) == content_in
+    with pytest.raises(ValueError):
+        Compressor().flush(1)
+
+
+def test_compressor_full_flush():
+    compressor = Compressor()
+    first = compressor.compress(b"hello, world! " * 10)
+    first += compressor.flush(Z_FULL_FLUSH)
+    second = compressor.compress(b"hello, world! " * 10) + compressor.flush()
+    # nothing after a full flush refers back before it
+    assert zlib.decompress(second, wbits=-15) == b"hello, world! " * 10
+    assert zlib.decompress(first + second, wbits=-15) == (
+        b"hello, world! " * 20
+    )
@@ -1,6 +1,25 @@
+import zlib
+from binascii import crc32
+from io import BytesIO
+from random import Random
+
 import pytest
 
-from rfc_1951.core import Distance, HuffmanEncoding, Length
+from rfc_1951.core import (
+    BitStream,
+    BitWriter,
+    DISTANCE_BASE,
+    DISTANCE_EXTRA_BITS,
+    Distance,
+    HuffmanEncoding,
+    LENGTH_BASE,
+    LENGTH_CODE,
+    LENGTH_EXTRA_BITS,
+    Length,
+    adler32,
+    crc32_combine,
+    distance_code,
+)
 
 
 def test_deflate_huffman_encoding_from_code_lengths():
@@ -8,6 +27,59 @@ def test_deflate_huffman_encoding_from_code_lengths():
     assert huffman.encoding == ["10", "0", "110", "111"]
 
 
+def test_huffman_encoding_reversed_codes():
+    huffman = HuffmanEncoding.from_alphabet_code_lengths([2, 1, 0, 3, 3])
+    assert huffman.code_lengths == [2, 1, 0, 3, 3]
+    assert huffman.reversed_codes == [0b01, 0b0, 0, 0b011, 0b111]
+
+
+@pytest.mark.parametrize(
+    "alphabet_code_lengths",
+    [
+        [2, 1, 3, 3],
+        [5] * 32,
+        # codes longer than the root table need a second level lookup
+        list(range(1, 14)) + [13],
+    ],
+)
+def test_read_huffman_bits(alphabet_code_lengths):
+    huffman = HuffmanEncoding.from_alphabet_code_lengths(alphabet_code_lengths)
+    stream = BitStream(b"")
+    values = list(range(len(alphabet_code_lengths)))
+    for value in values + values[::-1]:
+        code = huffman.encoding[value]
+        stream.write_code(len(code), int(code[::-1], 2))
+    stream.flush()
+    stream = BitStream(stream.underlying.getvalue())
+    decoded = [stream.read_huffman_bits(huffman) for _ in values * 2]
+    assert decoded == values + values[::-1]
+
+
+def test_read_huffman_bits_invalid_code():
+    huffman = HuffmanEncoding.from_alphabet_code_lengths([1])
+    with pytest.raises(KeyError, match="not have a valid code"):
+        BitStream(b"\x01").read_huffman_bits(huffman)
+
+
+@pytest.mark.parametrize(
+    "alphabet_code_lengths,error",
+    [
+        ([1, 1, 1], "over-subscribed"),
+        ([2, 1, 2, 3, 3], "over-subscribed"),
+        ([1, 2], "incomplete"),
+        ([2, 2, 2, 0], "incomplete"),
+    ],
+)
+def test_huffman_encoding_invalid_code_lengths(alphabet_code_lengths, error):
+    with pytest.raises(ValueError, match=f"invalid Huffman code.*{error}"):
+        HuffmanEncoding.from_alphabet_code_lengths(alphabet_code_lengths)
+
+
+def test_huffman_encoding_single_or_no_code():
+    assert HuffmanEncoding.from_alphabet_code_lengths([0, 1]).max_bits == 1
+    assert HuffmanEncoding.from_alphabet_code_lengths([0] * 30).max_bits == 0
+
+
 @pytest.mark.parametrize(
     "code,extra_bits,min_length",
     [
@@ -74,3 +146,103 @@ def test_from_distance(distance, code, additional_content):
     distance_code = Distance.from_distance(distance)
     assert distance_code.code == code
     assert distance_code.additional_content == additional_content
+
+
+def test_length_tables():
+    for length in range(Length.MIN_LENGTH, Length.MAX_LENGTH + 1):
+        length_code = Length.from_length(length)
+        code = LENGTH_CODE[length]
+        assert code == length_code.code
+        assert LENGTH_EXTRA_BITS[code] == Length(code).extra_bits
+        assert length - LENGTH_BASE[code] == length_code.additional_content
+
+
+def test_distance_tables():
+    for distance in range(1, 5):
+        assert distance_code(distance) == distance - 1
+        assert DISTANCE_BASE[distance - 1] == distance
+        assert DISTANCE_EXTRA_BITS[distance - 1] == 0
+    for distances, (code, extra_bits) in Distance.TABLE.items():
+        assert DISTANCE_BASE[code] == distances.start
+        assert DISTANCE_EXTRA_BITS[code] == extra_bits
+        assert len(distances) == 2 ** extra_bits
+        for distance in distances:
+            assert distance_code(distance) == code
+
+
+def test_bit_writer():
+    random = Random(0)
+    writer = BitWriter()
+    expected = num_bits = 0
+    for _ in range(1000):
+        if random.random() < 0.1:
+            content = random.randbytes(random.randrange(20))
+            writer.write_bytes(content)
+            n, value = 8 * len(content), int.from_bytes(content, "little")
+        else:
+            n = random.randrange(1, 33)
+            value = random.getrandbits(n)
+            writer.write_code(n, value)
+        expected |= value << num_bits
+        num_bits += n
+    assert writer.getvalue() == expected.to_bytes(
+        (num_bits + 7) // 8, "little"
+    )
+
+
+def test_bit_writer_flush_byte():
+    writer = BitWriter()
+    writer.write_code(3, 0b101)
+    writer.flush_byte()
+    writer.write_bytes(b"\xff")
+    writer.write(16, 0x1234)
+    assert writer.getvalue() == b"\x05\xff\x34\x12"
+
+
+def test_bit_stream_peek_consume():
+    stream = BitStream(bytes([0b10110100, 0b00000001]))
+    assert stream.peek(3) == 0b100
+    stream.consume(3)
+    assert stream.peek(6) == 0b110110
+    assert stream.read(13, prefer_bytes=False) == 0b110110
+    # bits past the end read as 0 but can't be consumed
+    assert stream.peek(8) == 0
+    with pytest.raises(EOFError):
+        stream.consume(1)
+
+
+def test_bit_stream_read_view():
+    content = bytes(range(256)) * 3
+    stream = BitStream(BytesIO(content))
+    stream.READ_SIZE = 100
+    assert stream.read(4, prefer_bytes=False) == 0
+    stream.clear_buffer()
+    assert stream.peek(16) == 1 | 2 << 8
+    # the view spans buffered bits and several chunks
+    assert bytes(stream.read_view(500)) == content[1:501]
+    view = stream.read_view(10)
+    assert view.obj is stream.chunk
+    assert bytes(view) == content[501:511]
+    with pytest.raises(EOFError):
+        stream.read_view(len(content))
+
+
+@pytest.mark.parametrize(
+    "len1,len2", [(0, 0), (10, 0), (0, 10), (1000, 70000)]
+)
+def test_crc32_combine(len1, len2):
+    random = Random(0)
+    first, second = random.randbytes(len1), random.randbytes(len2)
+    combined = crc32_combine(crc32(first), crc32(second), len(second))
+    assert combined == crc32(first + second)
+
+
+@pytest.mark.parametrize("length", [0, 1, 5551, 5552, 5553, 100000])
+def test_adler32(length):
+    content = Random(length).randbytes(length)
+    assert adler32(content) == zlib.adler32(content)
+    assert adler32(b"\xff" * length) == zlib.adler32(b"\xff" * length)
+    split = length // 3
+    assert adler32(content[split:], adler32(content[:split])) == zlib.adler32(
+        content
+    )
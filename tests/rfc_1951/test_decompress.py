@@ -1,6 +1,8 @@
 import sys
+import zlib
 from datetime import datetime
 from io import BufferedReader, BytesIO
+from random import Random
 from struct import pack
 
 import pkg_resources
@@ -101,3 +103,253 @@ def test_unzip_file():
     ) as out:
         in_file = out.read()
     assert gunzip(BitStream(in_file)) == expected
+
+
+def test_unzip_stream():
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        expected = f.read() * 4
+    compressor = zlib.compressobj(wbits=31)
+    zipped = compressor.compress(expected) + compressor.flush()
+    chunks = list(gunzip_stream(BytesIO(zipped)))
+    assert len(chunks) > 1
+    assert b"".join(chunks) == expected
+
+
+def test_inflater_bounded_window():
+    expected = bytes(range(256)) * 1024
+    compressor = zlib.compressobj(wbits=-15)
+    deflated = compressor.compress(expected) + compressor.flush()
+    inflater = Inflater(BitStream(deflated), chunk_size=1024)
+    output = b""
+    for chunk in inflater:
+        assert len(inflater.window) <= LZ77_MAX_LOOKBACK + 1024 + 258
+        output += chunk
+    assert output == expected
+
+
+def test_unzip_stream_bad_crc():
+    zipped = bytearray(bytes.fromhex(VALID_FILE_NEWLINE))
+    zipped[-8] ^= 0xFF
+    with pytest.raises(IOError, match="CRC"):
+        list(gunzip_stream(BytesIO(bytes(zipped))))
+
+
+def test_unzip_multiple_members():
+    first = bytes.fromhex(VALID_FILE)
+    second = bytes.fromhex(VALID_FILE_NEWLINE)
+    third = bytes.fromhex(VALID_FILE_DEVNULL)
+    expected = gunzip(BitStream(first)) + b"\n"
+    assert gunzip(BitStream(first + second + third)) == expected
+    members = scan_members(BytesIO(first + second + third))
+    assert [member.header.filename for member in members] == [
+        "Hello.scala",
+        None,
+        None,
+    ]
+    assert [(member.start, member.end) for member in members] == [
+        (0, len(first)),
+        (len(first), len(first + second)),
+        (len(first + second), len(first + second + third)),
+    ]
+    assert [(m.uncompressed_offset, m.size) for m in members] == [
+        (0, len(expected) - 1),
+        (len(expected) - 1, 1),
+        (len(expected), 0),
+    ]
+
+
+def test_unzip_members_partially_read():
+    zipped = bytes.fromhex(VALID_FILE) + bytes.fromhex(VALID_FILE_NEWLINE)
+    outputs = []
+    for member, chunks in gunzip_members(BytesIO(zipped)):
+        outputs.append(next(chunks)[:5])
+    assert outputs == [b"objec", b"\n"]
+
+
+@pytest.mark.parametrize(
+    "window,dist,length,expected",
+    [
+        (b"abc", 3, 3, b"abcabc"),
+        (b"abcdef", 5, 2, b"abcdefbc"),
+        (b"xa", 1, 5, b"xaaaaaa"),
+        (b"xab", 2, 7, b"xababababa"),
+        (b"abc", 3, 258, b"abc" * 87),
+    ],
+)
+def test_copy_back_reference(window, dist, length, expected):
+    window = bytearray(window)
+    copy_back_reference(window, dist, length)
+    assert window == expected
+
+
+def test_unzip_long_runs():
+    content = bytes(2 ** 20) + b"ab" * 2 ** 16 + bytes(range(256)) * 64
+    compressor = zlib.compressobj(wbits=-15)
+    zipped = compressor.compress(content) + compressor.flush()
+    assert decode(BitStream(zipped)) == content
+
+
+@pytest.mark.parametrize("level,step", [(0, 1000), (1, 1), (6, 7), (9, 4096)])
+def test_decompressor(level, step):
+    content = pkg_resources.resource_string(__name__, "data/rfc_1951")
+    compressor = zlib.compressobj(level, wbits=-15)
+    compressed = compressor.compress(content) + compressor.flush()
+    decompressor = Decompressor()
+    decompressed = b""
+    for start in range(0, len(compressed), step):
+        assert not decompressor.eof
+        decompressed += decompressor.decompress(
+            compressed[start : start + step]
+        )
+        # everything before the last few bytes of input is decoded
+        assert len(decompressed) >= len(
+            zlib.decompressobj(wbits=-15).decompress(
+                compressed[: max(0, start + step - 64)]
+            )
+        )
+    assert decompressor.eof
+    assert decompressed == content
+
+
+def test_decompressor_sync_flush():
+    compressor = zlib.compressobj(wbits=-15)
+    decompressor = Decompressor()
+    for message in [b"hello", b", world", b"!" * 1000]:
+        compressed = compressor.compress(message)
+        compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+        assert decompressor.decompress(compressed) == message
+    assert decompressor.decompress(compressor.flush()) == b""
+    assert decompressor.eof
+
+
+def test_decompressor_max_length():
+    content = bytes(100000) + b"hello, world" * 1000
+    compressed = zlib.compress(content)[2:-4] + b"unused"
+    decompressor = Decompressor()
+    chunks = [decompressor.decompress(compressed, 1000)]
+    while not decompressor.eof or decompressor.output_tail:
+        chunks.append(decompressor.decompress(b"", 1000))
+        assert len(chunks[-1]) <= 1000
+    assert b"".join(chunks) == content
+    assert decompressor.unused_data == b"unused"
+    decompressor.decompress(b" data")
+    assert decompressor.unused_data == b"unused data"
+
+
+def test_decompressor_max_length_keeps_input():
+    content = Random(0).randbytes(100000)
+    compressed = zlib.compress(content)[2:-4]
+    decompressor = Decompressor()
+    chunks = [decompressor.decompress(compressed, 1000)]
+    unconsumed = decompressor.unconsumed
+    # the input isn't copied until most of it has been decoded
+    for _ in range(10):
+        chunks.append(decompressor.decompress(b"", 1000))
+        assert decompressor.unconsumed is unconsumed
+    while not decompressor.eof or decompressor.output_tail:
+        chunks.append(decompressor.decompress(b"", 1000))
+    assert b"".join(chunks) == content
+
+
+def test_decompressor_dictionary():
+    dictionary = b"hello, world! " * 10
+    compressor = zlib.compressobj(wbits=-15, zdict=dictionary)
+    compressed = compressor.compress(b"hello, world!") + compressor.flush()
+    decompressor = Decompressor(dictionary)
+    assert decompressor.decompress(compressed) == b"hello, world!"
+
+
+def test_dynamic_codes_cached():
+    content = pkg_resources.resource_string(__name__, "data/rfc_1951")[:4096]
+    compressor = zlib.compressobj(wbits=-15)
+    compressed = b""
+    for _ in range(4):
+        compressed += compressor.compress(content)
+        # a full flush drops the history, so every block repeats its header
+        compressed += compressor.flush(zlib.Z_FULL_FLUSH)
+    compressed += compressor.flush()
+    get_huffman.cache_clear()
+    assert decompress_raw(compressed) == content * 4
+    cache_info = get_huffman.cache_info()
+    assert cache_info.misses == 3
+    assert cache_info.hits == 9
+
+
+@pytest.mark.parametrize(
+    "codes,error",
+    [
+        # code length 16 repeats the previous length, but there is none
+        ([(2, 0b01), (2, 0)], "repeats no previous length"),
+        # code length 18 repeats a zero at least 11 times
+        ([(1, 0), (2, 0b11), (7, 0)], "goes past 4 lengths"),
+    ],
+)
+def test_get_code_codes_invalid_repeat(codes, error):
+    # code length symbols 8, 16 and 18 with the codes 0, 10 and 11
+    code_huffman = HuffmanEncoding.from_alphabet_code_lengths(
+        [0] * 8 + [1] + [0] * 7 + [2, 0, 2]
+    )
+    writer = BitWriter()
+    for n, value in codes:
+        writer.write_code(n, value)
+    with pytest.raises(ValueError, match=error):
+        get_code_codes(4, code_huffman, BitStream(writer.getvalue()))
+
+
+def gzip_zeros(size: int) -> bytes:
+    compressor = zlib.compressobj(9, wbits=31)
+    return compressor.compress(bytes(size)) + compressor.flush()
+
+
+def test_unzip_limits():
+    zipped = gzip_zeros(2 ** 20)
+    limits = DecompressionLimits(2 ** 20, 1100, 10)
+    assert gunzip(BitStream(zipped), limits) == bytes(2 ** 20)
+    with pytest.raises(DecompressionLimitError, match="bytes"):
+        gunzip(BitStream(zipped), DecompressionLimits(max_output_bytes=1000))
+    with pytest.raises(DecompressionLimitError, match="times"):
+        gunzip(BitStream(zipped), DecompressionLimits(max_ratio=100))
+
+
+def test_unzip_limits_abort_early():
+    chunks = gunzip_stream(
+        BytesIO(gzip_zeros(2 ** 24)),
+        DecompressionLimits(max_output_bytes=100000),
+    )
+    output_size = 0
+    with pytest.raises(DecompressionLimitError):
+        for chunk in chunks:
+            output_size += len(chunk)
+    assert output_size <= 100000
+
+
+def test_unzip_limits_multiple_members():
+    zipped = gzip_zeros(1000) * 3
+    limits = DecompressionLimits(max_output_bytes=3000)
+    assert gunzip(BitStream(zipped), limits) == bytes(3000)
+    with pytest.raises(DecompressionLimitError):
+        gunzip(BitStream(zipped), DecompressionLimits(max_output_bytes=2999))
+
+
+def test_unzip_max_blocks():
+    compressor = zlib.compressobj(wbits=-15)
+    compressed = b""
+    for _ in range(4):
+        compressed += compressor.compress(b"hello, world!")
+        compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+    compressed += compressor.flush()
+    blocks = DecompressionLimits(max_blocks=9)
+    assert decompress_raw(compressed, limits=blocks) == b"hello, world!" * 4
+    with pytest.raises(DecompressionLimitError, match="blocks"):
+        decompress_raw(compressed, limits=DecompressionLimits(max_blocks=8))
+
+
+def test_decompressor_limits():
+    compressed = zlib.compress(bytes(2 ** 20))[2:-4]
+    decompressor = Decompressor(limits=DecompressionLimits(max_ratio=500))
+    with pytest.raises(DecompressionLimitError):
+        for start in range(0, len(compressed), 100):
+            decompressor.decompress(compressed[start : start + 100])
@@ -0,0 +1,42 @@
+import gzip
+
+import pkg_resources
+
+from rfc_1951.__main__ import main
+
+
+def test_compress_decompress_file(tmp_path, capsys):
+    content = pkg_resources.resource_string(__name__, "data/rfc_1951")
+    path = tmp_path / "rfc_1951.txt"
+    path.write_bytes(content)
+    assert main(["-9", "-v", str(path)]) == 0
+    assert not path.exists()
+    assert gzip.decompress(path.with_suffix(".txt.gz").read_bytes()) == content
+    assert "MB/s" in capsys.readouterr().err
+    assert main(["-d", "-k", str(path.with_suffix(".txt.gz"))]) == 0
+    assert path.read_bytes() == content
+    assert path.with_suffix(".txt.gz").exists()
+
+
+def test_stdout(tmp_path, capsysbinary):
+    path = tmp_path / "hello.txt"
+    path.write_bytes(b"hello, world")
+    assert main(["-c", "-1", str(path)]) == 0
+    assert path.exists()
+    compressed = capsysbinary.readouterr().out
+    assert gzip.decompress(compressed) == b"hello, world"
+    (tmp_path / "hello.gz").write_bytes(compressed * 2)
+    assert main(["-dc", str(tmp_path / "hello.gz")]) == 0
+    assert capsysbinary.readouterr().out == b"hello, world" * 2
+
+
+def test_errors(tmp_path, capsys):
+    path = tmp_path / "hello.txt"
+    path.write_bytes(b"hello, world")
+    assert main(["-d", str(path)]) == 1
+    (tmp_path / "hello.txt.gz").write_bytes(b"existing")
+    assert main([str(path)]) == 1
+    assert (tmp_path / "hello.txt.gz").read_bytes() == b"existing"
+    assert main(["-d", str(tmp_path / "hello.txt.gz")]) == 1
+    assert path.read_bytes() == b"hello, world"
+    assert capsys.readouterr().err.count("rfc_1951: ") == 3
@@ -0,0 +1,87 @@
+import zlib
+from io import BytesIO, SEEK_END
+from random import Random
+
+import pkg_resources
+import pytest
+
+from rfc_1951.compress import gzip
+from rfc_1951.random_access import *
+
+
+@pytest.fixture(scope="module")
+def expected() -> bytes:
+    name = "rfc_1951"
+    with open(
+        pkg_resources.resource_filename(__name__, f"data/{name}"), "rb"
+    ) as f:
+        return f.read() * 8
+
+
+@pytest.fixture(scope="module")
+def zipped(expected) -> bytes:
+    compressor = zlib.compressobj(wbits=31)
+    return compressor.compress(expected) + compressor.flush()
+
+
+def test_build_index(expected, zipped):
+    index = GzipIndex.build(BytesIO(zipped), span=2 ** 15)
+    assert index.length == len(expected)
+    assert len(index.points) > 2
+    for point in index.points[1:]:
+        assert (
+            point.window == expected[: point.uncompressed_offset][-(2 ** 15) :]
+        )
+
+
+@pytest.fixture(scope="module")
+def self_zipped(expected) -> bytes:
+    return gzip(BytesIO(expected))
+
+
+def test_build_index_own_gzip(expected, self_zipped):
+    span = 2 ** 15
+    index = GzipIndex.build(BytesIO(self_zipped), span)
+    assert index.length == len(expected)
+    assert span < index.length
+    assert len(index.points) > 1
+    reader = GzipRandomReader(BytesIO(self_zipped), index)
+    for point in index.points[1:]:
+        assert (
+            point.window == expected[: point.uncompressed_offset][-(2 ** 15) :]
+        )
+        reader.seek(point.uncompressed_offset - 10)
+        assert reader.read(20) == expected[
+            point.uncompressed_offset - 10 : point.uncompressed_offset + 10
+        ]
+
+
+def test_index_round_trip(zipped):
+    index = GzipIndex.build(BytesIO(zipped), span=2 ** 15)
+    assert GzipIndex.from_bytes(index.to_bytes()) == index
+
+
+def test_index_invalid():
+    with pytest.raises(IOError, match="not a gzip index"):
+        GzipIndex.from_bytes(b"\x00" * 64)
+
+
+def test_random_reads(expected, zipped):
+    index = GzipIndex.build(BytesIO(zipped), span=2 ** 15)
+    reader = GzipRandomReader(BytesIO(zipped), index)
+    random = Random(0)
+    for _ in range(20):
+        offset = random.randrange(len(expected))
+        size = random.randrange(100000)
+        reader.seek(offset)
+        assert reader.read(size) == expected[offset : offset + size]
+        assert reader.tell() == min(offset + size, len(expected))
+
+
+def test_sequential_reads(expected, zipped):
+    reader = GzipRandomReader(BytesIO(zipped))
+    assert reader.read(10) == expected[:10]
+    assert reader.read(20000) == expected[10:20010]
+    reader.seek(-5, SEEK_END)
+    assert reader.read() == expected[-5:]
+    assert reader.read() == b""
@@ -0,0 +1,75 @@
+import hashlib
+import hmac as reference_hmac
+
+import pytest
+
+from rfc_4634.hmac import *
+from rfc_4634.sha import *
+
+
+@pytest.mark.parametrize(
+    "function,reference",
+    [
+        (hmac_sha224, hashlib.sha224),
+        (hmac_sha256, hashlib.sha256),
+        (hmac_sha384, hashlib.sha384),
+        (hmac_sha512, hashlib.sha512),
+    ],
+)
+@pytest.mark.parametrize("key_length", [0, 20, 64, 128, 200])
+def test_hmac(function, reference, key_length):
+    key = bytes(range(key_length))
+    for message in [b"", b"hello world", bytes(300)]:
+        assert (
+            function(key, message)
+            == reference_hmac.new(key, message, reference).digest()
+        )
+
+
+def test_hmac_update_copy():
+    mac = Hmac(b"key", b"hello", Sha512)
+    copied = mac.copy()
+    mac.update(b" world")
+    expected = reference_hmac.new(b"key", b"hello world", hashlib.sha512)
+    assert mac.hexdigest() == expected.hexdigest()
+    assert copied.digest() == hmac_sha512(b"key", b"hello")
+    assert (mac.name, mac.digest_size, mac.block_size) == (
+        expected.name,
+        expected.digest_size,
+        expected.block_size,
+    )
+
+
+def test_hmac_pad_states_cached():
+    get_cached_pad_states.cache_clear()
+    for message in [b"first", b"second", b"third"]:
+        hmac_sha256(b"per request key", message)
+    assert get_cached_pad_states.cache_info().misses == 1
+    assert get_cached_pad_states.cache_info().hits == 2
+
+
+def test_hkdf():
+    # test case 1 of RFC 5869
+    input_key = bytes([0x0B] * 22)
+    salt = bytes(range(13))
+    info = bytes(range(0xF0, 0xFA))
+    key = hkdf_extract(salt, input_key)
+    assert key == bytes.fromhex(
+        "077709362c2e32df0ddc3f0dc47bba6390b6c73bb50f9c3122ec844ad7c2b3e5"
+    )
+    assert hkdf_expand(key, info, 42) == bytes.fromhex(
+        "3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf"
+        "34007208d5b887185865"
+    )
+    assert hkdf(input_key, salt, info, 42) == hkdf_expand(key, info, 42)
+
+
+def test_hkdf_not_cached():
+    get_cached_pad_states.cache_clear()
+    hkdf(b"input key", b"salt", b"info", 100)
+    assert get_cached_pad_states.cache_info().currsize == 0
+
+
+def test_hkdf_too_long():
+    with pytest.raises(ValueError):
+        hkdf_expand(bytes(32), length=255 * 32 + 1)
@@ -32,3 +32,80 @@ def test_sha384_512_pad():
 def test_sha(algorithm, message, reference):
     reference.update(message)
     assert algorithm.digest(message) == reference.digest()
+
+
+@pytest.mark.parametrize(
+    "algorithm,reference",
+    [
+        (Sha224, hashlib.sha224),
+        (Sha256, hashlib.sha256),
+        (Sha384, hashlib.sha384),
+        (Sha512, hashlib.sha512),
+    ],
+)
+@pytest.mark.parametrize("length", [0, 55, 56, 64, 111, 112, 128, 1000])
+def test_sha_lengths(algorithm, reference, length):
+    message = bytes(range(256)) * 4
+    # twice, since the hash value must start from the initial value again
+    for _ in range(2):
+        assert (
+            algorithm.digest(message[:length])
+            == reference(message[:length]).digest()
+        )
+
+
+@pytest.mark.parametrize(
+    "algorithm,reference",
+    [
+        (Sha224, hashlib.sha224),
+        (Sha256, hashlib.sha256),
+        (Sha384, hashlib.sha384),
+        (Sha512, hashlib.sha512),
+    ],
+)
+@pytest.mark.parametrize("step", [1, 7, 64, 100, 128])
+def test_sha_update(algorithm, reference, step):
+    message = bytes(range(256)) * 3
+    sha = algorithm(message[:5])
+    expected = reference(message[:5])
+    for start in range(5, len(message), step):
+        chunk = memoryview(message)[start : start + step]
+        sha.update(chunk)
+        expected.update(chunk)
+        assert sha.hexdigest() == expected.hexdigest()
+    assert (sha.name, sha.digest_size, sha.block_size) == (
+        expected.name,
+        expected.digest_size,
+        expected.block_size,
+    )
+
+
+def test_sha_copy():
+    prefix = Sha256(b"common prefix " * 10)
+    first = prefix.copy()
+    first.update(b"first")
+    second = prefix.copy()
+    second.update(b"second")
+    assert (
+        first.digest()
+        == hashlib.sha256(b"common prefix " * 10 + b"first").digest()
+    )
+    assert second.digest() == Sha256.digest(b"common prefix " * 10 + b"second")
+    assert prefix.digest() == Sha256.digest(b"common prefix " * 10)
+
+
+@pytest.mark.parametrize(
+    "algorithm,reference",
+    [
+        (Sha224, hashlib.sha224),
+        (Sha256, hashlib.sha256),
+        (Sha384, hashlib.sha384),
+        (Sha512, hashlib.sha512),
+    ],
+)
+def test_sha_digest_many(algorithm, reference):
+    pytest.importorskip("numpy")
+    messages = [bytes(range(length % 256)) * 2 for length in range(150)]
+    assert algorithm.digest_many(messages) == [
+        reference(message).digest() for message in messages
+    ]